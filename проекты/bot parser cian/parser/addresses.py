@@ -0,0 +1,90 @@
+"""
+Разбор адресов ЦИАН на части: регион, город, район, улица, дом.
+
+Адрес приходит одной строкой через запятую, например
+"Свердловская область, Екатеринбург, р-н Ленинский, мкр. Юго-Западный, ул. Громова, 15".
+Разбор делается один раз при записи (listing_store.upsert_rows, дозапись CSV),
+а бот фильтрует по готовым колонкам сравнением, без поиска подстрок в адресе.
+Район приводится к каноническому виду: без "р-н"/"район", с заглавной буквы.
+"""
+import re
+
+# Колонки таблицы, которые заполняет разбор
+ADDRESS_COLUMNS = ["Регион", "Город", "Район", "Улица", "Дом"]
+
+FEDERAL_CITIES = {"москва", "санкт-петербург", "севастополь"}
+
+_REGION_RE = re.compile(r"(област|край$|республик|автономн|^ао\b)", re.IGNORECASE)
+_DISTRICT_RE = re.compile(r"^(?:р-н|район)\s+(.+)$|^(.+?)\s+(?:р-н|район)$", re.IGNORECASE)
+_OKRUG_RE = re.compile(r"^([А-ЯЁ]{2,4}АО|.+\s+(?:административный\s+)?округ|поселение\s+.+)$", re.IGNORECASE)
+_SETTLEMENT_RE = re.compile(r"^(?:г\.|город|пос\.|пгт|с\.|д\.|рп)\s*(.+)$", re.IGNORECASE)
+_MICRODISTRICT_RE = re.compile(r"^(?:мкр\.?|микрорайон|жилрайон|ж/р|кв-л|квартал)\s", re.IGNORECASE)
+_STREET_RE = re.compile(
+    r"(^|\s)(ул\.|улица|пр\.|просп\.|проспект|пр-т|пер\.|переулок|наб\.|набережная|бул\.|бульвар|"
+    r"ш\.|шоссе|пл\.|площадь|тракт|проезд|пр-д|аллея|тупик|линия|километр|км)(\s|$)",
+    re.IGNORECASE,
+)
+_HOUSE_RE = re.compile(r"^\d+[\w/\-]*(\s*(к|корп\.?|стр\.?|с)\s*\d+\w*)*$", re.IGNORECASE)
+
+
+def _district_name(part):
+    """Каноническое имя района из части адреса ("р-н Ленинский" → "Ленинский") или None."""
+    m = _DISTRICT_RE.match(part)
+    if not m:
+        return None
+    name = (m.group(1) or m.group(2)).strip()
+    return name[:1].upper() + name[1:] if name else None
+
+
+def split_address(address):
+    """Разбирает адрес на части. Возвращает словарь по ADDRESS_COLUMNS (пустые — "")."""
+    result = dict.fromkeys(ADDRESS_COLUMNS, "")
+    if not isinstance(address, str):
+        address = ""  # NaN из pandas
+    parts = [p.strip() for p in address.split(",") if p.strip()]
+    rest = []
+    for part in parts:
+        lower = part.lower()
+        if not result["Регион"] and not result["Город"] and _REGION_RE.search(part):
+            result["Регион"] = part
+            continue
+        if not result["Город"] and lower in FEDERAL_CITIES:
+            result["Город"] = part
+            result["Регион"] = result["Регион"] or part
+            continue
+        district = _district_name(part)
+        if district:
+            result["Район"] = result["Район"] or district
+            continue
+        if _OKRUG_RE.match(part) or _MICRODISTRICT_RE.match(part):
+            continue
+        if not result["Улица"] and _STREET_RE.search(part):
+            result["Улица"] = part
+            continue
+        if result["Улица"] and not result["Дом"] and _HOUSE_RE.match(part):
+            result["Дом"] = part
+            continue
+        if not result["Город"] and not result["Улица"]:
+            m = _SETTLEMENT_RE.match(part)
+            result["Город"] = m.group(1).strip() if m else part
+            continue
+        rest.append(part)
+
+    # Улица без привычного сокращения ("Фронтовых Бригад, 15/4") — последняя часть перед домом
+    if not result["Улица"] and rest:
+        if len(rest) > 1 and _HOUSE_RE.match(rest[-1]):
+            result["Дом"] = rest[-1]
+            rest = rest[:-1]
+        result["Улица"] = rest[-1]
+    return result
+
+
+def add_address_columns(row):
+    """Дополняет строку таблицы частями адреса (уже заполненные колонки не трогает)."""
+    missing = [col for col in ADDRESS_COLUMNS if not (isinstance(row.get(col), str) and row[col].strip())]
+    if not missing:
+        return row
+    parts = split_address(row.get("Адрес"))
+    for col in missing:
+        row[col] = parts[col]
+    return row
@@ -0,0 +1,81 @@
+"""
+Нагрузочный прогон настоящего обхода против локальной заглушки ЦИАН.
+
+Поднимает fixture_site.py, направляет на него cian.py (BASE_URL) и запускает
+полный обход (сбор ссылок → детальные страницы → запись) для каждого числа
+воркеров из BENCH_WORKERS. Хранилище, журнал и CSV каждого прогона лежат во
+временной папке, рабочие данные не трогаются. В конце — таблица скоростей.
+"""
+import os
+import shutil
+import tempfile
+import time
+
+import cian
+import crawl_journal
+import fixture_site
+import listing_store
+import throttle
+
+BENCH_WORKERS = [1, 2, 4]  # числа воркеров для сравнения
+BENCH_FETCH_MODES = ["browser"]  # можно добавить "http"
+BENCH_RATE = 50.0  # потолок темпа throttle для локального сервера (запросов в секунду)
+
+
+def run_once(base_url, workers, fetch_mode):
+    """Один полный обход заглушки. Возвращает (строк, секунд)."""
+    tmp_dir = tempfile.mkdtemp(prefix="cian_bench_")
+    try:
+        listing_store.STORE_PATH = os.path.join(tmp_dir, "listings.sqlite3")
+        crawl_journal.JOURNAL_PATH = os.path.join(tmp_dir, "crawl_journal.sqlite3")
+        cian.OUTPUT_DIR = tmp_dir
+        cian.BASE_URL = base_url
+        cian.STORAGE = "sqlite"
+        cian.SHARDED = False
+        cian.RECORD_HTML = False
+        cian.WORKERS = workers
+        cian.FETCH_MODE = fetch_mode
+        throttle._hosts.clear()
+
+        job = cian.make_job(mode="full")
+        started = time.perf_counter()
+        cian.run_job(job)
+        wall = time.perf_counter() - started
+        return listing_store.count_listings(job["city"], job["sale"]), wall
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main():
+    throttle.START_RATE = throttle.MAX_RATE = BENCH_RATE
+    server, base_url = fixture_site.start_server(port=0)
+    expected = fixture_site.FIXTURE_PAGES * fixture_site.FIXTURE_PER_PAGE
+    print(
+        f"✓ Заглушка: {base_url}, страниц выдачи {fixture_site.FIXTURE_PAGES}, объявлений {expected}, "
+        f"задержка {fixture_site.FIXTURE_LATENCY * 1000:.0f} мс, сбоев {fixture_site.FIXTURE_FAIL_RATE:.0%}, "
+        f"проверок {fixture_site.FIXTURE_CAPTCHA_RATE:.0%}"
+    )
+
+    results = []
+    try:
+        for fetch_mode in BENCH_FETCH_MODES:
+            for workers in BENCH_WORKERS:
+                rows, wall = run_once(base_url, workers, fetch_mode)
+                results.append((fetch_mode, workers, rows, wall))
+    finally:
+        server.shutdown()
+
+    print(f"\n{'=' * 60}")
+    print("НАГРУЗОЧНЫЙ ПРОГОН")
+    print(f"{'=' * 60}")
+    for fetch_mode, workers, rows, wall in results:
+        rate = rows / wall if wall > 0 else 0.0
+        print(
+            f" {fetch_mode:<8} воркеров {workers}: строк {rows}/{expected}, "
+            f"{wall:.1f} с, {rate:.2f} строк/с"
+        )
+    print(f" Запросов к заглушке: {fixture_site.FixtureHandler.stats['requests']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import os
 import time
-import random
 import re
+import queue
+import threading
 from urllib.parse import urlencode, urlunparse, urlparse, ParseResult
 
 from selenium import webdriver
@@ -17,12 +18,27 @@ from selenium.common.exceptions import (
 )
 import pandas as pd
 
+import cian_http
+import crawl_journal
+import shards
+import listing_store
+import driver_manager
+import throttle
+import html_archive
+import failures
+import addresses
+
+BASE_URL = "https://cian.ru"  # адрес сайта (для нагрузочных тестов — локальный fixture_site.py)
+# Задание по умолчанию для `python cian.py`; несколько городов/сделок сразу — crawl.py
 CITY_NAME = "chelyabinsk"
 PAGES_LIMIT = '1'
-MODE = "full"  # test or full
+MODE = "full"  # test, full или incremental (только новые: сортировка по дате, стоп на известных)
 SALE = 'rent'  # sale or rent
+KNOWN_STREAK = 30  # incremental: сколько подряд уже известных объявлений означает «дальше только старые»
 
-OUTPUT_FILE = os.path.join(os.path.dirname(__file__), f"{CITY_NAME}_cian_{SALE}.csv")
+OUTPUT_DIR = os.path.dirname(os.path.abspath(__file__))  # CSV: <город>_cian_<сделка>.csv
+STORAGE = "sqlite"  # sqlite (listings.sqlite3, upsert по id) или csv (дозапись в CSV задания)
+EXPORT_CSV = True  # при STORAGE = "sqlite": выгружать CSV задания для бота в конце запуска
 
 CITY_REGIONS = {
     "moscow": {"name": "Москва", "region": "1"},
@@ -40,9 +56,25 @@ COLUMNS = [
     "Этаж",
     "Этажей в доме",
     "Телефон",
+    "Регион",
+    "Город",
+    "Район",
+    "Улица",
+    "Дом",
 ]
 
 HEADLESS = True
+LEAN_BROWSER = True  # не грузить картинки/медиа/шрифты/трекеры, pageLoadStrategy=eager
+WORKERS = 4  # число параллельных браузеров для детальных страниц (не больше числа ядер)
+BATCH_SIZE = 10  # сколько строк копить перед записью (одна транзакция/дозапись на пачку)
+FETCH_MODE = "browser"  # browser или http (HTTP-загрузка, браузер только для телефона/при сбое)
+HARVEST_CARDS = True  # брать цену/площадь/адрес/этаж с карточек выдачи, детальную страницу — только если чего-то не хватает
+SHARDED = False  # делить поиск на шарды по цене/площади (для больших регионов, например Москвы)
+STREAMING = False  # детальные страницы парсятся параллельно со сбором ссылок (конвейер), а не после него
+STREAM_QUEUE_SIZE = 100  # конвейер: сколько ссылок/строк может ждать в очереди (сбор притормаживает)
+STREAM_PUT_POLL = 1.0  # конвейер: как часто (с) проверять, живы ли воркеры, пока очередь заполнена
+PHONE_MODE = "inline"  # inline (телефон при обходе) или deferred (только для избранного, см. phone_resolver.py)
+RECORD_HTML = False  # сохранять сырой HTML выдачи и объявлений в html_archive.sqlite3 (для replay.py)
 SELECTORS_BY_SALE_TYPE = {
     'sale': {
         'price': [
@@ -86,76 +118,253 @@ SELECTORS_BY_SALE_TYPE = {
     }
 }
 
-def get_selectors(selector_type):
-    """Возвращает селекторы для текущего типа сделки (sale/rent)."""
-    sale_type = SALE if SALE in SELECTORS_BY_SALE_TYPE else 'sale'
+def get_selectors(selector_type, sale):
+    """Возвращает селекторы для типа сделки (sale/rent)."""
+    sale_type = sale if sale in SELECTORS_BY_SALE_TYPE else 'sale'
     return SELECTORS_BY_SALE_TYPE[sale_type].get(selector_type, [])
 
 
 # ================== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ==================
 
+# Что блокируем в «лёгком» режиме (шаблоны для Chrome DevTools Network.setBlockedURLs)
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.mp4", "*.webm", "*.mp3",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*mc.yandex.ru*", "*top-fwz1.mail.ru*", "*vk.com/rtrg*", "*facebook.net*",
+    "*api-maps.yandex.ru*", "*core-renderer-tiles.maps.yandex.net*",
+]
+
+FIREFOX_LEAN_PREFS = {
+    "permissions.default.image": 2,  # без картинок
+    "media.autoplay.default": 5,
+    "media.peerconnection.enabled": False,
+    "gfx.downloadable_fonts.enabled": False,
+    "browser.cache.disk.enable": False,
+    "browser.cache.offline.enable": False,
+    "privacy.trackingprotection.enabled": True,  # встроенная блокировка трекеров
+    "extensions.update.enabled": False,
+    "app.update.enabled": False,
+    "datareporting.healthreport.uploadEnabled": False,
+    "toolkit.telemetry.enabled": False,
+    "dom.webnotifications.enabled": False,
+    "geo.enabled": False,
+}
+
+CHROME_LEAN_ARGS = [
+    "--blink-settings=imagesEnabled=false",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-sync",
+    "--disk-cache-size=1",
+    "--mute-audio",
+]
+
+
+ENGINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".browser_engine")
+_engine_lock = threading.Lock()
+_preferred_engine = None  # движок, который запустился последним (firefox/chrome)
+
+
+def _launch_firefox():
+    options = FirefoxOptions()
+    if HEADLESS:
+        options.add_argument("--headless")
+        options.add_argument("--width=1920")
+        options.add_argument("--height=1080")
+    if LEAN_BROWSER:
+        options.page_load_strategy = "eager"
+        for name, value in FIREFOX_LEAN_PREFS.items():
+            options.set_preference(name, value)
+    return webdriver.Firefox(options=options)
+
+
+def _launch_chrome():
+    options = ChromeOptions()
+    if HEADLESS:
+        options.add_argument("--headless")
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-dev-shm-usage")
+        options.add_argument("--window-size=1920,1080")
+    if LEAN_BROWSER:
+        options.page_load_strategy = "eager"
+        for arg in CHROME_LEAN_ARGS:
+            options.add_argument(arg)
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    driver = webdriver.Chrome(options=options)
+    if LEAN_BROWSER:
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+        except Exception as cdp_error:
+            print(f"⚠ Не удалось включить блокировку ресурсов: {cdp_error}")
+    return driver
+
+
+BROWSER_ENGINES = {"firefox": _launch_firefox, "chrome": _launch_chrome}
+
+
+def _engine_order():
+    """Сначала движок, который уже запускался (в этом или прошлом запуске), затем остальные."""
+    global _preferred_engine
+    with _engine_lock:
+        if _preferred_engine is None and os.path.exists(ENGINE_FILE):
+            try:
+                with open(ENGINE_FILE, "r", encoding="utf-8") as f:
+                    name = f.read().strip()
+                _preferred_engine = name if name in BROWSER_ENGINES else None
+            except OSError:
+                pass
+        preferred = _preferred_engine
+    order = list(BROWSER_ENGINES)
+    if preferred:
+        order.remove(preferred)
+        order.insert(0, preferred)
+    return order
+
+
+def _remember_engine(name):
+    global _preferred_engine
+    with _engine_lock:
+        if _preferred_engine == name:
+            return
+        _preferred_engine = name
+        try:
+            with open(ENGINE_FILE, "w", encoding="utf-8") as f:
+                f.write(name)
+        except OSError:
+            pass
+
+
 def get_driver():
-    """Создает и возвращает драйвер браузера (Firefox → Chrome)."""
-    try:
-        options = FirefoxOptions()
-        if HEADLESS:
-            options.add_argument("--headless")
-            options.add_argument("--width=1920")
-            options.add_argument("--height=1080")
-        driver = webdriver.Firefox(options=options)
-        print("✓ Firefox браузер запущен")
-        return driver
-    except Exception as e:
-        print(f"⚠ Firefox не найден: {e}")
-        print("Пробуем Chrome...")
+    """Создает и возвращает драйвер браузера (Firefox → Chrome, рабочий движок запоминается)."""
+    last_error = None
+    for name in _engine_order():
         try:
-            options = ChromeOptions()
-            if HEADLESS:
-                options.add_argument("--headless")
-                options.add_argument("--no-sandbox")
-                options.add_argument("--disable-dev-shm-usage")
-                options.add_argument("--window-size=1920,1080")
-            driver = webdriver.Chrome(options=options)
-            print("✓ Chrome браузер запущен")
-            return driver
-        except Exception as e2:
-            print(f"✗ Ошибка при запуске браузера: {e2}")
-            raise
+            driver = BROWSER_ENGINES[name]()
+        except Exception as e:
+            last_error = e
+            print(f"⚠ Не удалось запустить {name}: {e}")
+            continue
+        _remember_engine(name)
+        print(f"✓ Браузер {name} запущен")
+        return driver
+    print(f"✗ Ошибка при запуске браузера: {last_error}")
+    raise last_error
+
+
+# Сводки загрузки страниц и извлечения полей копятся в задании (job["page_load"], job["extract"]):
+# задания crawl.py идут одновременно, и у каждого своя сводка
+_page_load_lock = threading.Lock()
+
+# Тайминги навигации и объём переданных данных текущей страницы
+PAGE_TIMING_SCRIPT = """
+const nav = performance.getEntriesByType('navigation')[0];
+const res = performance.getEntriesByType('resource');
+let bytes = nav ? (nav.transferSize || 0) : 0;
+for (const r of res) bytes += r.transferSize || 0;
+return {
+    dcl: nav ? nav.domContentLoadedEventEnd : 0,
+    load: nav ? nav.loadEventEnd : 0,
+    bytes: bytes,
+    requests: res.length + 1
+};
+"""
+
+
+def log_page_timing(driver, job=None, label=""):
+    """Печатает тайминги загрузки страницы и копит их в сводке задания job["page_load"]."""
+    try:
+        t = driver.execute_script(PAGE_TIMING_SCRIPT) or {}
+    except Exception:
+        return
+    dcl = float(t.get("dcl") or 0)
+    load = float(t.get("load") or 0)
+    kb = float(t.get("bytes") or 0) / 1024
+    requests_count = int(t.get("requests") or 0)
+    if job is not None:
+        with _page_load_lock:
+            stats = job["page_load"]
+            stats["pages"] += 1
+            stats["dcl_ms"] += dcl
+            stats["load_ms"] += load
+            stats["kb"] += kb
+            stats["requests"] += requests_count
+    print(f" ⏱ {label}DOM {dcl:.0f} мс, load {load:.0f} мс, {kb:.0f} КБ, запросов {requests_count}")
+
+
+def print_page_load_summary(job):
+    """Средние тайминги загрузки страниц задания."""
+    with _page_load_lock:
+        stats = dict(job["page_load"])
+    pages = stats["pages"]
+    if not pages:
+        return
+    print(
+        f" Загрузка страниц ({'lean' if LEAN_BROWSER else 'обычный браузер'}): {pages} стр., в среднем "
+        f"DOM {stats['dcl_ms'] / pages:.0f} мс, load {stats['load_ms'] / pages:.0f} мс, "
+        f"{stats['kb'] / pages:.0f} КБ, {stats['requests'] / pages:.0f} запросов"
+    )
+
+
+def output_path(city_key, sale):
+    """CSV задания (его читает бот)."""
+    return os.path.join(OUTPUT_DIR, f"{city_key}_cian_{sale}.csv")
 
 
-def resolve_settings():
-    """Готовит настройки без запросов к пользователю."""
-    mode = (MODE or "test").strip().lower()
-    pages_raw = PAGES_LIMIT if PAGES_LIMIT is not None else 0
+def make_job(city=None, sale=None, mode=None, pages=None):
+    """Описание задания обхода (город + тип сделки); пустые аргументы берутся из настроек модуля.
+
+    Все функции обхода получают задание явно, поэтому несколько заданий
+    могут идти одновременно в одном процессе.
+    """
+    mode = (mode or MODE or "test").strip().lower()
+    pages_raw = pages if pages is not None else (PAGES_LIMIT if PAGES_LIMIT is not None else 0)
     pages = int(pages_raw) if isinstance(pages_raw, (int, float, str)) and str(pages_raw).isdigit() else 0
-    city_key = (CITY_NAME or "").strip().lower()
+    city_key = (city or CITY_NAME or "").strip().lower()
+    sale = (sale or SALE or "").strip().lower()
 
     if city_key not in CITY_REGIONS:
-        raise ValueError(f"Город '{CITY_NAME}' не найден в CITY_REGIONS")
-
-    city_info = CITY_REGIONS[city_key]
+        raise ValueError(f"Город '{city_key}' не найден в CITY_REGIONS")
+    if sale not in ("rent", "sale"):
+        raise ValueError(f"Тип сделки '{sale}' — ожидается rent или sale")
 
-    if mode not in ("test", "full"):
+    if mode not in ("test", "full", "incremental"):
         mode = "test"
 
-    max_pages = None if mode == "full" else (pages if pages > 0 else 1)
-    return mode, max_pages, city_info
+    return {
+        "city": city_key,
+        "sale": sale,
+        "mode": mode,
+        "max_pages": None if mode in ("full", "incremental") else (pages if pages > 0 else 1),
+        "region": CITY_REGIONS[city_key]["region"],
+        "name": CITY_REGIONS[city_key]["name"],
+        "key": crawl_journal.job_key(city_key, sale),
+        "output_file": output_path(city_key, sale),
+        "page_load": {"pages": 0, "dcl_ms": 0.0, "load_ms": 0.0, "kb": 0.0, "requests": 0},
+        "extract": {"pages": 0, "round_trips": 0, "seconds": 0.0},
+    }
 
 
-def build_search_page_url(region_id: str, page: int) -> str:
-    """Строит URL поиска cat.php с нужным region и p."""
+def build_search_page_url(region_id: str, page: int, sale: str, filters: dict = None) -> str:
+    """Строит URL поиска cat.php с нужным region и p (и доп. фильтрами шарда/сортировкой)."""
     query = {
-        "deal_type": f"{SALE}",
+        "deal_type": f"{sale}",
         "engine_version": "2",
         "offer_type": "offices",
         "office_type[0]": "1",
         "p": str(page),
         "region": str(region_id),
     }
+    if filters:
+        query.update(filters)
 
+    base = urlparse(BASE_URL)
     parsed = ParseResult(
-        scheme="https",
-        netloc="cian.ru",
+        scheme=base.scheme,
+        netloc=base.netloc,
         path="/cat.php",
         params="",
         query=urlencode(query),
@@ -228,29 +437,40 @@ def clean_address(address: str) -> str:
     return address.strip()
 
 
-def load_existing_links():
-    """Считывает уже сохранённые ссылки из файла."""
-    if not os.path.exists(OUTPUT_FILE):
+def load_existing_links(job):
+    """Считывает уже сохранённые ссылки задания (из хранилища или из файла)."""
+    output_file = job["output_file"]
+    if STORAGE == "sqlite":
+        listing_store.init_store()
+        if listing_store.count_listings(job["city"], job["sale"]) == 0 and os.path.exists(output_file):
+            # Первый запуск на хранилище — разово переносим накопленный CSV
+            listing_store.import_csv(output_file, job["city"], job["sale"])
+        links = listing_store.existing_links(job["city"], job["sale"])
+        print(f"\n✓ Хранилище: {listing_store.STORE_PATH}")
+        print(f"✓ Уже сохранено объявлений ({job['key']}): {len(links)}")
+        return links
+
+    if not os.path.exists(output_file):
         return set()
 
     try:
-        df = pd.read_csv(OUTPUT_FILE, encoding="utf-8-sig")
+        df = pd.read_csv(output_file, encoding="utf-8-sig")
         if "Ссылка" in df.columns:
             links = set(df["Ссылка"].dropna().astype(str))
-            print(f"\n✓ Найден существующий файл: {OUTPUT_FILE}")
+            print(f"\n✓ Найден существующий файл: {output_file}")
             print(f"✓ Уже сохранено объявлений: {len(links)}")
             return links
     except Exception as e:
-        print(f"\n⚠ Не удалось прочитать существующий файл {OUTPUT_FILE}: {e}")
+        print(f"\n⚠ Не удалось прочитать существующий файл {output_file}: {e}")
     return set()
 
 
-def append_rows_to_csv(rows):
+def append_rows_to_csv(rows, output_file):
     """Дозаписывает строки в CSV."""
     if not rows:
         return
 
-    df = pd.DataFrame(rows)
+    df = pd.DataFrame([addresses.add_address_columns(dict(row)) for row in rows])
     for col in COLUMNS:
         if col not in df.columns:
             df[col] = None
@@ -269,28 +489,180 @@ def append_rows_to_csv(rows):
             return format_number(val)
         df["Цена"] = df["Цена"].apply(format_price)
 
-    mode = "a" if os.path.exists(OUTPUT_FILE) else "w"
+    mode = "a" if os.path.exists(output_file) else "w"
     header = mode == "w"
-    df.to_csv(OUTPUT_FILE, index=False, encoding="utf-8-sig", mode=mode, header=header)
-    print(f"\n✓ Сохранено пачкой {len(df)} объявлений в файл {OUTPUT_FILE}")
+    df.to_csv(output_file, index=False, encoding="utf-8-sig", mode=mode, header=header)
+    print(f"\n✓ Сохранено пачкой {len(df)} объявлений в файл {output_file}")
+
+
+def record_html(url, kind, html, job_key=None):
+    """Кладёт HTML страницы в архив (при RECORD_HTML = True)."""
+    if not RECORD_HTML:
+        return
+    try:
+        html_archive.save_page(url, kind, html, job=job_key)
+    except Exception as e:
+        print(f" ⚠ Не удалось сохранить HTML в архив: {e}")
+
+
+def save_rows(rows, job):
+    """Сохраняет пачку строк задания: upsert в SQLite-хранилище или дозапись в CSV."""
+    if not rows:
+        return
+    if STORAGE == "sqlite":
+        saved = listing_store.upsert_rows(rows, job["city"], job["sale"])
+        print(f"\n✓ Сохранено пачкой {saved} объявлений в хранилище ({job['key']})")
+    else:
+        append_rows_to_csv(rows, job["output_file"])
+
+
+def export_output_csv(job):
+    """Выгружает хранилище в CSV задания (если включено)."""
+    if STORAGE == "sqlite" and EXPORT_CSV:
+        listing_store.export_csv(job["output_file"], job["city"], job["sale"], columns=COLUMNS)
 
 
 # ================== СБОР ССЫЛОК ==================
 
-def collect_cian_links(driver, region_id, mode="full", max_pages=None):
-    """Собирает ссылки на объявления по региону."""
+# Карточки выдачи: один скрипт на страницу возвращает поля всех article
+CARD_EXTRACT_SCRIPT = """
+const sale = arguments[0];
+const text = (el) => (el && (el.innerText || el.textContent) || '').trim();
+const first = (root, list) => {
+    for (const s of list) {
+        const t = text(root.querySelector(s));
+        if (t) return t;
+    }
+    return '';
+};
+const cards = [];
+for (const article of document.querySelectorAll('article')) {
+    const link = article.querySelector('a[href*="/' + sale + '/commercial/"]');
+    if (!link) continue;
+    const geo = Array.from(article.querySelectorAll("[data-name='GeoLabel']")).map(text).filter(Boolean);
+    cards.push({
+        href: link.href,
+        price: first(article, ["[data-mark='MainPrice']", "[data-testid*='price']", "[class*='price']"]),
+        address: geo.length ? geo.join(', ') : first(article, ["[data-name='AddressItem']", "[class*='address']"]),
+        title: first(article, ["[data-mark='OfferTitle']", "[data-name='TitleComponent']", "[class*='title']"]),
+        text: text(article)
+    });
+}
+return cards;
+"""
+
+CARD_FIELDS = ["Адрес", "Цена", "Площадь", "Этаж", "Этажей в доме"]
+
+
+def normalize_card_fields(url, card):
+    """Частичная строка таблицы из карточки выдачи (телефона на карточке нет)."""
+    card_text = card.get("text") or ""
+    floor = ""
+    m = re.search(r"(-?\d+)\s*/\s*(\d+)\s*этаж", card_text, re.IGNORECASE)
+    if not m:
+        m = re.search(r"(-?\d+)\s*этаж\s*из\s*(\d+)", card_text, re.IGNORECASE)
+    if m:
+        floor = f"{m.group(1)} из {m.group(2)}"
+
+    row = normalize_page_fields(url, {
+        "price": card.get("price") or "",
+        "address": card.get("address") or "",
+        "title": card.get("title") or "",
+        "area": card.get("title") or "",
+        "floor": floor,
+        "body": card_text,
+        "phone": "",
+    })
+    row["Телефон"] = None
+    return row
+
+
+def harvest_cards(driver, cards, sale):
+    """Дописывает в cards {ссылка: частичная строка} данные карточек текущей страницы выдачи."""
+    try:
+        raw_cards = driver.execute_script(CARD_EXTRACT_SCRIPT, sale) or []
+    except Exception as e:
+        print(f" ⚠ Не удалось прочитать карточки: {e}")
+        return
+    for card in raw_cards:
+        url = offer_link(card.get("href"), sale)
+        if not url:
+            continue
+        try:
+            cards[url] = normalize_card_fields(url, card)
+        except Exception:
+            continue
+
+
+def card_is_complete(row):
+    """Хватает ли карточки, чтобы не открывать детальную страницу."""
+    if not row:
+        return False
+    if PHONE_MODE != "deferred":
+        return False
+    return all(row.get(col) not in (None, "") for col in CARD_FIELDS)
+
+
+def merge_card_row(card_row, detail_row):
+    """Дополняет строку детальной страницы полями карточки (детальная приоритетнее)."""
+    if not card_row:
+        return detail_row
+    if not detail_row:
+        return None
+    merged = dict(card_row)
+    merged.update({k: v for k, v in detail_row.items() if v not in (None, "")})
+    return merged
+
+
+def offer_id_from_url(url):
+    """Числовой id объявления ЦИАН из ссылки (или None)."""
+    m = re.search(r"/commercial/(\d+)", url or "")
+    return int(m.group(1)) if m else None
+
+
+def offer_link(href, sale):
+    """Каноническая ссылка на объявление с типом сделки sale (или None)."""
+    m = re.search(rf"/{sale}/commercial/(\d+)", href or "")
+    return f"{BASE_URL}/{sale}/commercial/{m.group(1)}/" if m else None
+
+
+def deal_from_url(url):
+    """Тип сделки (rent/sale) по ссылке на объявление."""
+    m = re.search(r"/(rent|sale)/commercial/", url or "")
+    return m.group(1) if m else "sale"
+
+
+def collect_cian_links(driver, job, max_pages=None, start_page=1, on_page=None, on_complete=None,
+                       filters=None, cards=None, known=None, high_water=0):
+    """Собирает ссылки на объявления по региону и типу сделки задания.
+
+    max_pages — лимит страниц (тестовый режим).
+    filters — доп. параметры запроса (шард: тип помещения, цена, площадь).
+    cards — если передан словарь, в него складываются частичные строки с карточек выдачи.
+    known / high_water (режим incremental) — уже известные ссылки и максимальный виденный id:
+    сбор останавливается после KNOWN_STREAK известных объявлений подряд.
+    start_page — с какой страницы начинать (продолжение прерванного сбора).
+    on_page(page, links) вызывается после каждой прочитанной страницы,
+    on_complete() — если выдача пройдена до конца (а не прервана таймаутом/капчей).
+    """
+    region_id, sale = job["region"], job["sale"]
     print(f"\n--- СБОР ССЫЛОК С ЦИАН ---")
-    print(f"Регион (region): {region_id}")
+    print(f"Регион (region): {region_id}, сделка: {sale}")
     all_links = set()
-    page = 1
+    page = start_page
+    known_streak = 0
+    challenges = 0  # проверок подряд на текущей странице
 
     while True:
-        if mode == "test" and max_pages is not None and page > max_pages:
+        if max_pages is not None and page > max_pages:
             print(f"\n✓ Достигнут лимит страниц тестового режима: {max_pages}")
+            if on_complete:
+                on_complete()
             break
 
-        page_url = build_search_page_url(region_id, page)
+        page_url = build_search_page_url(region_id, page, sale, filters)
         print(f"\nСтраница {page}: {page_url}")
+        started = throttle.wait(page_url)
         driver.get(page_url)
 
         try:
@@ -298,9 +670,24 @@ def collect_cian_links(driver, region_id, mode="full", max_pages=None):
                 EC.presence_of_element_located((By.CSS_SELECTOR, "article, body"))
             )
         except TimeoutException:
+            throttle.report(page_url, started, throttle.ERROR)
             print(" ⚠ Таймаут при загрузке страницы, прекращаем сбор ссылок.")
             break
 
+        outcome = throttle.report(page_url, started, throttle.check_browser_page(driver))
+        if outcome in (throttle.CHALLENGE, throttle.BLOCKED):
+            challenges += 1
+            if challenges > throttle.BLOCK_AFTER:
+                print(" ✗ Проверка на робота не проходит, прекращаем сбор ссылок.")
+                break
+            print(" ⚠ Страница-проверка (капча/блокировка), повторим после паузы")
+            continue
+        challenges = 0
+
+        log_page_timing(driver, job, "выдача: ")
+        if RECORD_HTML:
+            record_html(page_url, "search", driver.page_source, job["key"])
+
         time.sleep(0.3)
         driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
         time.sleep(0.2)
@@ -308,20 +695,20 @@ def collect_cian_links(driver, region_id, mode="full", max_pages=None):
         time.sleep(0.1)
 
         page_links = set()
+        page_order = []  # ссылки в порядке выдачи (важно для incremental)
 
         try:
             # Ищем ссылки на объявления с динамической переменной
             all_links_on_page = driver.find_elements(
-                By.XPATH, f"//a[contains(@href, '/{SALE}/commercial/')]"
+                By.XPATH, f"//a[contains(@href, '/{sale}/commercial/')]"
             )
             for a in all_links_on_page:
                 try:
-                    href = a.get_attribute("href")
-                    if href:
-                        m = re.search(rf"/{SALE}/commercial/(\d+)", href)
-                        if m:
-                            office_id = m.group(1)
-                            page_links.add(f"https://cian.ru/{SALE}/commercial/{office_id}/")
+                    link = offer_link(a.get_attribute("href"), sale)
+                    if link:
+                        if link not in page_links:
+                            page_order.append(link)
+                        page_links.add(link)
                 except (StaleElementReferenceException, AttributeError):
                     continue
         except Exception as e:
@@ -329,46 +716,176 @@ def collect_cian_links(driver, region_id, mode="full", max_pages=None):
 
         # Резервный поиск
         try:
-            cards = driver.find_elements(By.CSS_SELECTOR, f"article a[href*='/{SALE}/commercial/']")
-            for a in cards:
+            card_links = driver.find_elements(By.CSS_SELECTOR, f"article a[href*='/{sale}/commercial/']")
+            for a in card_links:
                 try:
-                    href = a.get_attribute("href")
-                    if href:
-                        m = re.search(rf"/{SALE}/commercial/(\d+)", href)
-                        if m:
-                            office_id = m.group(1)
-                            page_links.add(f"https://cian.ru/{SALE}/commercial/{office_id}/")
+                    link = offer_link(a.get_attribute("href"), sale)
+                    if link:
+                        page_links.add(link)
                 except (StaleElementReferenceException, AttributeError):
                     continue
         except Exception:
             pass
 
+        if cards is not None and page_links:
+            harvest_cards(driver, cards, sale)
+
         if not page_links:
             print(" ⚠ На странице не найдено объявлений.")
             try:
-                page_title = driver.title
-                print(f" Заголовок страницы: {page_title}")
-                page_text = driver.find_element(By.TAG_NAME, "body").text.lower()
-                if "робот" in page_text or "captcha" in page_text or "подтвердите" in page_text:
-                    print(" ⚠ Возможно, появилась CAPTCHA или блокировка!")
+                print(f" Заголовок страницы: {driver.title}")
             except Exception:
                 pass
+            if on_complete:
+                on_complete()
             break
 
         new_links = page_links - all_links
         all_links.update(page_links)
         print(f" ✓ Найдено на странице: {len(page_links)} (новых: {len(new_links)}) | Всего: {len(all_links)}")
 
+        if on_page:
+            on_page(page, new_links)
+
+        if known is not None:
+            for link in page_order:
+                offer_id = offer_id_from_url(link) or 0
+                if link in known or offer_id <= high_water:
+                    known_streak += 1
+                else:
+                    known_streak = 0
+            if known_streak >= KNOWN_STREAK:
+                print(f" ✓ {known_streak} известных объявлений подряд — дальше только старые, останавливаемся.")
+                if on_complete:
+                    on_complete()
+                break
+
         if len(new_links) == 0:
             print(" ⚠ Новых ссылок нет, прекращаем.")
+            if on_complete:
+                on_complete()
             break
 
         page += 1
-        time.sleep(random.uniform(0.3, 0.7))
 
     return sorted(all_links)
 
 
+def _shard_worker(worker_id, job, manager, tasks, merged, lock, stats, on_links, cards):
+    """Воркер сбора: берёт шарды из очереди, насыщенные делит и возвращает в очередь.
+
+    Браузер перезапускается по лимитам только между шардами.
+    """
+    own_manager = manager is None
+    if own_manager:
+        manager = driver_manager.DriverManager(get_driver, name=f"шардов {worker_id} ")
+    try:
+        manager.get()
+        while True:
+            shard = tasks.get()
+            if shard is None:
+                tasks.task_done()
+                break
+            try:
+                if stats["stopped"]:
+                    continue  # конвейер остановлен — оставшиеся шарды только снимаем с очереди
+                pages = [0]
+
+                def count_page(page, links):
+                    pages[0] += 1
+                    if on_links:
+                        on_links(links)
+
+                print(f"\n[шард #{worker_id}] {shards.describe_shard(shard)}")
+                try:
+                    links = collect_cian_links(
+                        manager.get(), job, filters=shards.shard_filters(shard), on_page=count_page, cards=cards,
+                    )
+                finally:
+                    manager.page_done(pages[0])
+                with lock:
+                    merged.update(links)
+                    stats["shards"] += 1
+                    stats["pages"] += pages[0]
+
+                if pages[0] >= shards.SEARCH_PAGE_CAP:
+                    children = shards.split_shard(shard, job["sale"])
+                    if children:
+                        print(f" ↳ Шард насыщен ({pages[0]} стр.), делим на {len(children)}")
+                        with lock:
+                            stats["split"] += 1
+                        for child in children:
+                            tasks.put(child)
+                    else:
+                        print(" ⚠ Шард насыщен, но делить дальше некуда — часть выдачи может быть потеряна")
+            except PipelineStopped as e:
+                with lock:
+                    stats["stopped"] = e
+            except Exception as e:
+                print(f" ✗ Ошибка сбора шарда: {e}")
+            finally:
+                tasks.task_done()
+    except Exception as e:
+        # Шарды из очереди разберут остальные воркеры (первый работает на уже запущенном браузере)
+        print(f" ✗ Воркер сбора {worker_id}: {e}")
+    finally:
+        if own_manager:
+            manager.close()
+
+
+def collect_links_sharded(manager, job, workers=WORKERS, on_links=None, cards=None):
+    """Собирает ссылки по шардам параллельно несколькими браузерами.
+
+    Ссылки всех шардов сливаются в одно множество (дубли между шардами убираются).
+    on_links(links) вызывается после каждой страницы любого шарда.
+    cards — словарь для частичных строк с карточек (см. collect_cian_links).
+    """
+    plan = shards.plan_shards(job["sale"])
+    workers = max(1, min(workers or 1, os.cpu_count() or 1, len(plan)))
+    print(f"\n--- ШАРДИРОВАННЫЙ СБОР: {len(plan)} шардов, воркеров: {workers} ---")
+
+    tasks = queue.Queue()
+    for shard in plan:
+        tasks.put(shard)
+
+    merged = set()
+    lock = threading.Lock()
+    # on_links зовётся из разных потоков — сериализуем
+    def locked_on_links(links):
+        with lock:
+            on_links(links)
+
+    safe_on_links = locked_on_links if on_links else None
+    stats = {"shards": 0, "pages": 0, "split": 0, "stopped": None}
+    started = time.perf_counter()
+
+    threads = []
+    for worker_id in range(1, workers + 1):
+        t = threading.Thread(
+            target=_shard_worker,
+            args=(worker_id, job, manager if worker_id == 1 else None, tasks, merged, lock, stats, safe_on_links,
+                  cards),
+            name=f"cian-shard-{worker_id}",
+            daemon=True,
+        )
+        t.start()
+        threads.append(t)
+
+    tasks.join()  # ждём, пока все шарды (включая дочерние) будут обработаны
+    for _ in threads:
+        tasks.put(None)
+    for t in threads:
+        t.join()
+    if stats["stopped"]:
+        raise stats["stopped"]
+
+    print(
+        f"\n✓ Шардов обработано: {stats['shards']} (делений: {stats['split']}), страниц: {stats['pages']}, "
+        f"уникальных ссылок: {len(merged)}, за {time.perf_counter() - started:.1f} с"
+    )
+    return sorted(merged)
+
+
 # ================== ПАРСИНГ СТРАНИЦ ==================
 
 def validate_phone_number(phone):
@@ -582,218 +1099,771 @@ def _extract_float_from_text(text):
         return None
 
 
-def parse_cian_page(driver, url, idx, total):
-    """Парсит одну детальную страницу объявления ЦИАН."""
-    try:
-        print(f"\n[{idx}/{total}] ЦИАН: {url}")
-        driver.get(url)
+AREA_XPATH = "//*[contains(text(),'Площадь')]/ancestor::*[self::div or self::li or self::span][1]"
+FLOOR_XPATH = "//*[contains(text(),'Этаж')]/ancestor::*[self::div or self::li][1]"
 
-        try:
-            WebDriverWait(driver, 12).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "body"))
-            )
-        except TimeoutException:
-            print(" ⚠ Таймаут при загрузке объявления")
-            return None
+# Один скрипт вместо десятков find_element: перебирает селекторы прямо в браузере
+DOM_EXTRACT_SCRIPT = """
+const sel = arguments[0];
+const text = (el) => (el && (el.innerText || el.textContent) || '').trim();
+const first = (list) => {
+    for (const s of list) {
+        try {
+            const t = text(document.querySelector(s));
+            if (t) return t;
+        } catch (e) {}
+    }
+    return '';
+};
+const byXPath = (xp) => {
+    try {
+        return text(document.evaluate(xp, document, null,
+            XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue);
+    } catch (e) { return ''; }
+};
+return {
+    price: first(sel.price),
+    address: first(sel.address),
+    title: first(sel.title),
+    area: byXPath(sel.area_xpath),
+    floor: byXPath(sel.floor_xpath),
+    body: document.body ? (document.body.innerText || '') : '',
+    phone: ''
+};
+"""
+
+EXTRACT_MODE = "script"  # script (один execute_script) или selenium (поштучные find_element)
+_extract_stats_lock = threading.Lock()
+
+
+def read_page_fields_selenium(driver, sale):
+    """Собирает сырые текстовые поля открытой страницы через Selenium.
+
+    Возвращает (поля, число вызовов find_element).
+    """
+    lookups = 0
+
+    def first_text(selectors):
+        # Как safe_find_texts, но с подсчётом опробованных селекторов
+        nonlocal lookups
+        for selector in selectors:
+            lookups += 1
+            text = safe_find_texts(driver, selector)
+            if text:
+                return text
+        return ""
 
-        time.sleep(0.4)
-
-        data = {
-            "Ссылка": url,
-            "Адрес": "",
-            "Цена": None,
-            "Тип помещения": "",
-            "Площадь": None,
-            "Этаж": None,
-            "Этажей в доме": None,
-            "Телефон": None,
-        }
-
-        # Используем адаптивные селекторы для текущего типа сделки
-        price_selectors = get_selectors('price')
-        price_text = safe_find_texts(driver, price_selectors)
-        if price_text:
-            data["Цена"] = extract_price(price_text)
-
-        # Адрес — адаптивные селекторы
-        address_selectors = get_selectors('address')
-        address = safe_find_texts(driver, address_selectors)
-        if address:
-            data["Адрес"] = clean_address(address)
-
-        # Заголовок — адаптивные селекторы
-        title_selectors = get_selectors('title')
-        title_text = safe_find_texts(driver, title_selectors)
-        if title_text:
-            title_lower = title_text.lower()
-            data["Тип помещения"] = "Офис" if "офис" in title_lower else "Свобод. назнач."
-        else:
-            data["Тип помещения"] = "Свобод. назнач."
+    def element_text(by, value):
+        nonlocal lookups
+        lookups += 1
+        try:
+            return driver.find_element(by, value).text
+        except Exception:
+            return ""
 
+    fields = {
+        "price": first_text(get_selectors('price', sale)),
+        "address": first_text(get_selectors('address', sale)),
+        "title": first_text(get_selectors('title', sale)),
         # Площадь и этаж — резервные методы (работают универсально)
-        total_area = None
-        floor_cur = None
-        floor_total = None
+        "area": element_text(By.XPATH, AREA_XPATH),
+        "floor": element_text(By.XPATH, FLOOR_XPATH),
+        # Полный текст страницы (резервный источник)
+        "body": element_text(By.TAG_NAME, "body"),
+        "phone": "",
+    }
+    return fields, lookups
 
-        try:
-            el = driver.find_element(
-                By.XPATH,
-                "//*[contains(text(),'Площадь')]/ancestor::*[self::div or self::li or self::span][1]",
-            )
-            area_text = el.text
-            m = re.search(r"([\d\s]+[.,]?\d*)\s*м²", area_text)
-            if m:
-                number_str = m.group(1).replace(" ", "").replace(" ", "")
-                v = _extract_float_from_text(number_str)
-                if v:
-                    total_area = format_number(v)
-        except Exception:
-            pass
 
-        try:
-            el = driver.find_element(
-                By.XPATH,
-                "//*[contains(text(),'Этаж')]/ancestor::*[self::div or self::li][1]",
-            )
-            m = re.search(r"(-?\d+)\s*из\s*(\d+)", el.text)
-            if m:
-                c = int(m.group(1))
-                t = int(m.group(2))
-                floor_cur, floor_total = c, t
-        except Exception:
-            pass
+def read_page_fields_script(driver, sale):
+    """Собирает сырые текстовые поля одним execute_script. Возвращает (поля, 1)."""
+    selectors = {
+        "price": get_selectors('price', sale),
+        "address": get_selectors('address', sale),
+        "title": get_selectors('title', sale),
+        "area_xpath": AREA_XPATH,
+        "floor_xpath": FLOOR_XPATH,
+    }
+    fields = driver.execute_script(DOM_EXTRACT_SCRIPT, selectors) or {}
+    return {key: fields.get(key) or "" for key in ("price", "address", "title", "area", "floor", "body", "phone")}, 1
 
-        # Полный текст страницы (резервный источник)
-        try:
-            page_text = driver.find_element(By.TAG_NAME, "body").text
-        except Exception:
-            page_text = ""
-
-        # Площадь — резервный поиск
-        if total_area is None:
-            m = re.search(r"Площадь[:\s]*([\d\s]+[.,]?\d*)\s*м²", page_text, re.IGNORECASE)
-            if not m:
-                m = re.search(r"([\d\s]+[.,]?\d*)\s*м²", page_text)
-            if m:
-                number_str = (m.group(1) if m.lastindex else m.group(0)).replace(" ", "").replace(" ", "")
-                v = _extract_float_from_text(number_str)
-                if v:
-                    total_area = format_number(v)
-
-        data["Площадь"] = total_area
-
-        # Этаж — резервный поиск
-        if floor_cur is None or floor_total is None:
-            m = re.search(r"Этаж\s+(-?\d+)\s+из\s+(\d+)", page_text, re.IGNORECASE)
-            if m:
-                try:
-                    c = int(m.group(1))
-                    t = int(m.group(2))
-                    floor_cur, floor_total = c, t
-                except Exception:
-                    pass
 
-        data["Этаж"] = floor_cur
-        data["Этажей в доме"] = floor_total
+def read_page_fields(driver, sale, job=None):
+    """Сырые поля страницы (селекторы для типа сделки sale) с подсчётом обращений к WebDriver и времени.
 
-        # Телефон
+    Обращения: 1 на скрипт извлечения, у Selenium — по одному на каждый find_element.
+    Счётчики копятся в сводке задания job["extract"], если задание передано.
+    """
+    reader = read_page_fields_selenium if EXTRACT_MODE == "selenium" else read_page_fields_script
+
+    t0 = time.perf_counter()
+    try:
+        fields, round_trips = reader(driver, sale)
+    except Exception as e:
+        if reader is read_page_fields_selenium:
+            raise
+        print(f" ⚠ Скрипт извлечения не сработал ({e}), перебираем селекторы")
+        fields, lookups = read_page_fields_selenium(driver, sale)
+        round_trips = 1 + lookups  # неудачный скрипт тоже был обращением
+    elapsed = time.perf_counter() - t0
+
+    if job is not None:
+        with _extract_stats_lock:
+            stats = job["extract"]
+            stats["pages"] += 1
+            stats["round_trips"] += round_trips
+            stats["seconds"] += elapsed
+    print(f" ⏱ Поля: {round_trips} обращений к браузеру, {elapsed * 1000:.0f} мс")
+    return fields
+
+
+def normalize_page_fields(url, fields):
+    """Превращает сырые тексты полей страницы в строку таблицы (без сети)."""
+    data = {
+        "Ссылка": url,
+        "Адрес": "",
+        "Цена": None,
+        "Тип помещения": "",
+        "Площадь": None,
+        "Этаж": None,
+        "Этажей в доме": None,
+        "Телефон": None,
+    }
+
+    price_text = fields.get("price")
+    if price_text:
+        data["Цена"] = extract_price(price_text)
+
+    address = fields.get("address")
+    if address:
+        data["Адрес"] = clean_address(address)
+
+    title_text = fields.get("title")
+    if title_text:
+        title_lower = title_text.lower()
+        data["Тип помещения"] = "Офис" if "офис" in title_lower else "Свобод. назнач."
+    else:
+        data["Тип помещения"] = "Свобод. назнач."
+
+    total_area = None
+    floor_cur = None
+    floor_total = None
+
+    m = re.search(r"([\d\s]+[.,]?\d*)\s*м²", fields.get("area") or "")
+    if m:
+        number_str = m.group(1).replace(" ", "").replace("\xa0", "")
+        v = _extract_float_from_text(number_str)
+        if v:
+            total_area = format_number(v)
+
+    m = re.search(r"(-?\d+)\s*из\s*(\d+)", fields.get("floor") or "")
+    if m:
+        floor_cur, floor_total = int(m.group(1)), int(m.group(2))
+
+    page_text = fields.get("body") or ""
+
+    # Площадь — резервный поиск
+    if total_area is None:
+        m = re.search(r"Площадь[:\s]*([\d\s]+[.,]?\d*)\s*м²", page_text, re.IGNORECASE)
+        if not m:
+            m = re.search(r"([\d\s]+[.,]?\d*)\s*м²", page_text)
+        if m:
+            number_str = (m.group(1) if m.lastindex else m.group(0)).replace(" ", "").replace("\xa0", "")
+            v = _extract_float_from_text(number_str)
+            if v:
+                total_area = format_number(v)
+
+    data["Площадь"] = total_area
+
+    # Этаж — резервный поиск
+    if floor_cur is None or floor_total is None:
+        m = re.search(r"Этаж\s+(-?\d+)\s+из\s+(\d+)", page_text, re.IGNORECASE)
+        if m:
+            floor_cur, floor_total = int(m.group(1)), int(m.group(2))
+
+    data["Этаж"] = floor_cur
+    data["Этажей в доме"] = floor_total
+
+    data["Телефон"] = validate_phone_number(fields.get("phone"))
+    return data
+
+
+def parse_cian_page(driver, url, idx, total, job=None):
+    """Парсит одну детальную страницу объявления ЦИАН (job — для архива HTML и сводок).
+
+    При неудаче бросает исключение; класс сбоя — failures.classify_exception.
+    """
+    print(f"\n[{idx}/{total}] ЦИАН: {url}")
+    started = throttle.wait(url)
+    try:
+        driver.get(url)
+        WebDriverWait(driver, 12).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "body"))
+        )
+    except TimeoutException:
+        throttle.report(url, started, throttle.ERROR)
+        raise failures.PageFailure(failures.TIMEOUT, "таймаут при загрузке объявления")
+
+    outcome = throttle.report(url, started, throttle.check_browser_page(driver))
+    if outcome in (throttle.CHALLENGE, throttle.BLOCKED):
+        raise failures.PageFailure(failures.CHALLENGE, "страница-проверка (капча/блокировка)")
+
+    log_page_timing(driver, job)
+    if RECORD_HTML:
+        record_html(url, "detail", driver.page_source, job and job["key"])
+
+    data = normalize_page_fields(url, read_page_fields(driver, deal_from_url(url), job))
+    if data["Цена"] is None and not data["Адрес"]:
+        raise failures.PageFailure(failures.INCOMPLETE, "страница без цены и адреса (не догрузилась)")
+
+    # Телефон (в режиме deferred его получает phone_resolver.py для избранного)
+    if PHONE_MODE != "deferred":
         phone_result = extract_phone_number(driver)
         data["Телефон"] = phone_result if phone_result else None
 
-        time.sleep(random.uniform(0.3, 0.6))
-        return data
+    return data
 
+
+def fetch_phone_with_browser(driver, url):
+    """Открывает страницу в браузере только ради кнопки телефона."""
+    started = throttle.wait(url)
+    try:
+        driver.get(url)
+        WebDriverWait(driver, 12).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "body"))
+        )
     except Exception as e:
-        print(f" ✗ Ошибка при парсинге страницы: {e}")
+        throttle.report(url, started, throttle.ERROR)
+        print(f" ⚠ Не удалось открыть страницу для телефона: {e}")
+        return None
+    if throttle.report(url, started, throttle.check_browser_page(driver)) in (throttle.CHALLENGE, throttle.BLOCKED):
+        print(" ⚠ Страница-проверка (капча/блокировка), телефон не получен")
         return None
+    return extract_phone_number(driver)
+
+
+def parse_cian_page_http(url, idx, total, get_browser, job=None):
+    """Парсит детальную страницу по HTTP; браузер — только для телефона или если разбор не удался.
+
+    get_browser — функция без аргументов, лениво возвращающая драйвер.
+    Снятое объявление (404/410 или отметка на странице) — failures.REMOVED, без браузера.
+    Страница-проверка (капча/блокировка) — failures.CHALLENGE, тоже без браузера.
+    """
+    print(f"\n[{idx}/{total}] ЦИАН (http): {url}")
+    status, html = cian_http.fetch_page(url)
+    if status in (404, 410) or (status == 200 and cian_http.is_offer_removed(html)):
+        raise failures.PageFailure(failures.REMOVED, f"объявление снято (HTTP {status})")
+    if status is not None and html is None:
+        # fetch_page опознал капчу/блокировку: повтор — через RetryQueue и паузу throttle, а не сразу браузером
+        raise failures.PageFailure(failures.CHALLENGE, f"страница-проверка (капча/блокировка), HTTP {status}")
+    data = None
+    if status == 200 and html:
+        record_html(url, "detail", html, job and job["key"])
+        try:
+            fields = cian_http.extract_detail_fields(html)
+            data = normalize_page_fields(url, fields) if fields else None
+        except Exception as e:
+            print(f" ⚠ Ошибка разбора HTML: {e}")
+    elif status is not None:
+        print(f" ⚠ HTTP {status}")
+
+    if not data or data["Цена"] is None or not data["Адрес"] or data["Площадь"] is None:
+        print(" ⚠ HTML разобрать не удалось, открываем в браузере")
+        return parse_cian_page(get_browser(), url, idx, total, job)
+
+    if not data["Телефон"] and PHONE_MODE != "deferred":
+        data["Телефон"] = fetch_phone_with_browser(get_browser(), url)
+    return data
+
+
+# ================== ПУЛ БРАУЗЕРОВ ==================
+
+_WORKER_DONE = object()
+
+
+def _detail_worker(worker_id, job, manager, tasks, results, total, stats, retries, stream=False):
+    """Воркер пула: берёт ссылки из общей очереди и парсит их своим браузером.
+
+    stream=True — очередь пополняется на ходу, воркер ждёт новые ссылки до None.
+    Временные сбои уходят в retries (failures.RetryQueue) и повторяются в этом же
+    запуске; воркер не завершается, пока в ней есть ссылки.
+    """
+    own_manager = manager is None
+    if own_manager:
+        manager = driver_manager.DriverManager(get_driver, name=f"воркера {worker_id} ")
+    st = stats[worker_id]
+    started = time.perf_counter()
+    used_browser = [False]
+    closing = False
+
+    def get_browser():
+        used_browser[0] = True
+        return manager.get()
+
+    def next_task():
+        nonlocal closing
+        while True:
+            item = retries.pop_due()
+            if item is not None:
+                return item
+            delay = retries.next_delay()  # None — повторов не ждём
+            if not closing:
+                try:
+                    item = tasks.get(timeout=delay) if stream else tasks.get_nowait()
+                except queue.Empty:
+                    closing = not stream  # новых ссылок не будет, остались только повторы
+                    continue
+                if item is None:
+                    closing = True
+                    continue
+                return item
+            if delay is None:
+                return None
+            time.sleep(delay)
+
+    try:
+        if FETCH_MODE != "http":
+            get_browser()
+        while True:
+            item = next_task()
+            if item is None:
+                break
+            idx, url = item
+            t0 = time.perf_counter()
+            used_browser[0] = False
+            reason = None
+            try:
+                if FETCH_MODE == "http":
+                    row = parse_cian_page_http(url, idx, total, get_browser, job)
+                else:
+                    row = parse_cian_page(get_browser(), url, idx, total, job)
+            except Exception as e:
+                row = None
+                reason = failures.classify_exception(e)
+                print(f" ✗ [{reason}] {e}")
+            if used_browser[0]:
+                manager.page_done()
+            if reason == failures.BROWSER:
+                manager.recycle("сбой браузера")
+            st["busy"] += time.perf_counter() - t0
+            st["pages"] += 1
+            if row:
+                st["ok"] += 1
+            else:
+                st["failed"] += 1
+                reason = reason or failures.PARSE
+                delay = retries.schedule(idx, url, reason)
+                if delay is not None:
+                    print(f" ↻ Повтор через {delay:.0f} с")
+                    continue
+            retries.record(url, reason)
+            results.put((url, row, reason))
+    except Exception as e:
+        print(f" ✗ Воркер {worker_id}: {e}")
+    finally:
+        st["wall"] = time.perf_counter() - started
+        st["recycles"] = manager.recycles
+        if own_manager:
+            manager.close()
+        results.put(_WORKER_DONE)
+
+
+def print_workers_summary(stats, wall_time, job):
+    """Печатает сводку по воркерам: страницы, ошибки, время."""
+    print(f"\n{'=' * 60}")
+    print("СВОДКА ПО ВОРКЕРАМ")
+    print(f"{'=' * 60}")
+    total_pages = 0
+    for worker_id in sorted(stats):
+        st = stats[worker_id]
+        total_pages += st["pages"]
+        avg = st["busy"] / st["pages"] if st["pages"] else 0.0
+        print(
+            f" Воркер {worker_id}: страниц {st['pages']} (ок {st['ok']}, ошибок {st['failed']}), "
+            f"время {st['wall']:.1f} с, в среднем {avg:.2f} с/стр., перезапусков браузера {st.get('recycles', 0)}"
+        )
+    rate = total_pages / wall_time if wall_time > 0 else 0.0
+    print(f" Итого: {total_pages} страниц за {wall_time:.1f} с ({rate:.2f} стр/с)")
+    with _extract_stats_lock:
+        extract = dict(job["extract"])
+    pages = extract["pages"]
+    if pages:
+        print(
+            f" Извлечение полей ({EXTRACT_MODE}): в среднем "
+            f"{extract['round_trips'] / pages:.1f} обращений, "
+            f"{extract['seconds'] / pages * 1000:.0f} мс на страницу"
+        )
+
+
+def _start_detail_workers(job, manager, tasks, results, total, workers, stream=False):
+    """Запускает воркеры пула. Первый работает через manager (если он передан).
+
+    Возвращает (потоки, статистика воркеров, общая очередь повторов).
+    """
+    retries = failures.RetryQueue()
+    stats = {
+        worker_id: {"pages": 0, "ok": 0, "failed": 0, "busy": 0.0, "wall": 0.0}
+        for worker_id in range(1, workers + 1)
+    }
+    threads = []
+    for worker_id in range(1, workers + 1):
+        t = threading.Thread(
+            target=_detail_worker,
+            args=(worker_id, job, manager if worker_id == 1 else None, tasks, results, total, stats, retries, stream),
+            name=f"cian-worker-{worker_id}",
+            daemon=True,
+        )
+        t.start()
+        threads.append(t)
+    return threads, stats, retries
+
+
+def _write_results(results, workers, job, journal=True, cards=None, started=None):
+    """Единственный писатель: собирает результаты воркеров и сбрасывает их пачками.
+
+    Работает, пока все workers воркеров не сообщат о завершении. Возвращает число сохранённых строк.
+    """
+    rows_to_save = []
+    total_parsed = 0
+    done = 0
+
+    def flush():
+        nonlocal rows_to_save, total_parsed
+        save_rows(rows_to_save, job)
+        if journal:
+            crawl_journal.mark_done([r["Ссылка"] for r in rows_to_save])
+        if not total_parsed and started is not None:
+            print(f" ✓ Первые строки записаны через {time.perf_counter() - started:.1f} с после старта")
+        total_parsed += len(rows_to_save)
+        rows_to_save = []
+
+    while done < workers:
+        item = results.get()
+        if item is _WORKER_DONE:
+            done += 1
+            continue
+        url, row, reason = item
+        if cards:
+            row = merge_card_row(cards.get(url), row)
+        if row:
+            rows_to_save.append(row)
+        elif journal:
+            crawl_journal.mark_failed(url, reason or failures.PARSE, permanent=reason == failures.REMOVED)
+        if len(rows_to_save) >= BATCH_SIZE:
+            flush()
+
+    if rows_to_save:
+        flush()
+    return total_parsed
+
+
+def parse_links_parallel(manager, links, job, workers=WORKERS, journal=True, cards=None):
+    """Парсит детальные страницы пулом браузеров, сохраняет пачками из одного потока.
+
+    Первый воркер работает через уже созданный manager (DriverManager), остальные
+    поднимают свои; браузеры перезапускаются по лимитам страниц/памяти.
+    cards — частичные строки с карточек выдачи: ими дополняются поля, которых нет на детальной странице.
+    Если journal=True, статус каждой ссылки фиксируется в журнале обхода
+    (done — только после записи пачки).
+    Возвращает число сохранённых строк.
+    """
+    total = len(links)
+    if not total:
+        return 0
+
+    workers = max(1, min(workers or 1, os.cpu_count() or 1, total))
+    print(f"\nВоркеров (браузеров): {workers}")
+
+    tasks = queue.Queue()
+    for idx, url in enumerate(links, 1):
+        tasks.put((idx, url))
+    results = queue.Queue()
+
+    started = time.perf_counter()
+    threads, stats, retries = _start_detail_workers(job, manager, tasks, results, total, workers)
+    total_parsed = _write_results(results, workers, job, journal=journal, cards=cards)
+
+    for t in threads:
+        t.join()
+
+    print_workers_summary(stats, time.perf_counter() - started, job)
+    retries.print_report()
+    return total_parsed
+
+
+class PipelineStopped(Exception):
+    """Конвейер остановлен: стадию, которой передаются данные, больше некому выполнять."""
+
+
+def _put_while_alive(q, item, threads, what):
+    """Кладёт item в ограниченную очередь, пока жив хоть один из читающих её потоков.
+
+    Если все они завершились (например, ни один браузер воркера не запустился),
+    очередь больше никто не разберёт — вместо вечного ожидания PipelineStopped.
+    """
+    while any(t.is_alive() for t in threads):
+        try:
+            q.put(item, timeout=STREAM_PUT_POLL)
+            return
+        except queue.Full:
+            continue
+    raise PipelineStopped(f"все {what} завершились, сбор ссылок остановлен")
+
+
+def crawl_streaming(collect, job, existing_links, pending=(), workers=WORKERS, cards=None):
+    """Конвейер: сбор ссылок → пул детальных страниц → писатель, все стадии одновременно.
+
+    collect(push) запускает сбор ссылок и вызывает push(links) для каждой прочитанной
+    страницы выдачи (после записи ссылок в журнал). Ссылки сразу уходят в ограниченную
+    очередь воркеров (STREAM_QUEUE_SIZE), полные карточки — прямо писателю. pending —
+    ссылки из журнала, оставшиеся с прошлого запуска. Браузер сбора не делится
+    с воркерами: у каждого воркера свой. Возвращает число сохранённых строк.
+    Если все воркеры завершились (не запустился браузер), сбор прерывается PipelineStopped.
+    """
+    workers = max(1, min(workers or 1, os.cpu_count() or 1))
+    print(f"\nКонвейер: воркеров (браузеров) для детальных страниц: {workers}, очередь: {STREAM_QUEUE_SIZE}")
+
+    tasks = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    results = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    started = time.perf_counter()
+    threads, stats, retries = _start_detail_workers(job, None, tasks, results, "?", workers, stream=True)
+
+    written = {}
+    writer = threading.Thread(
+        target=lambda: written.setdefault("rows", _write_results(results, workers, job, cards=cards, started=started)),
+        name="cian-writer",
+        daemon=True,
+    )
+    writer.start()
+
+    seen = set()
+    counter = {"queued": 0, "cards": 0, "known": 0}
+
+    def push(links):
+        already_saved = []
+        for url in sorted(links):
+            if url in seen:
+                continue
+            seen.add(url)
+            if url in existing_links:
+                already_saved.append(url)
+                counter["known"] += 1
+            elif cards is not None and card_is_complete(cards.get(url)):
+                counter["cards"] += 1
+                _put_while_alive(results, (url, cards[url], None), [writer], "потоки записи")
+            else:
+                counter["queued"] += 1
+                # блокируется, если воркеры не успевают
+                _put_while_alive(tasks, (counter["queued"], url), threads, "воркеры детальных страниц")
+        crawl_journal.mark_done(already_saved)
+
+    try:
+        if pending:
+            print(f"Ссылок из журнала с прошлого запуска: {len(pending)}")
+            push(pending)
+        collect(push)
+    finally:
+        try:
+            for _ in threads:
+                _put_while_alive(tasks, None, threads, "воркеры детальных страниц")
+        except PipelineStopped:
+            pass  # сигнал завершения получать уже некому
+        for t in threads:
+            t.join()
+        writer.join()
+
+    wall = time.perf_counter() - started
+    print(
+        f"\n✓ Конвейер: ссылок в работу {counter['queued']}, полных карточек {counter['cards']}, "
+        f"уже в таблице {counter['known']}, за {wall:.1f} с"
+    )
+    print_workers_summary(stats, wall, job)
+    retries.print_report()
+    return written.get("rows", 0)
 
 
 # ================== ОСНОВНАЯ ЛОГИКА ==================
 
-def main():
-    driver = None
+def finish_run(job, total_parsed):
+    """Выгрузка CSV и итоговые сводки задания.
+
+    Сводка темпа (throttle) общая для всех заданий процесса — её печатает тот,
+    кто запускал задания (main или crawl.py), один раз в конце.
+    """
+    export_output_csv(job)
+    print_page_load_summary(job)
+
+    print(f"\n{'=' * 60}")
+    print(f"✓ ПАРСИНГ ЗАВЕРШЁН ({job['key']})")
+    print(f"✓ Всего новых объявлений сохранено: {total_parsed}")
+    print(f"✓ Файл с данными: {job['output_file']}")
+    print(f"{'=' * 60}")
+
+
+def run_job(job):
+    """Полный обход одного задания (см. make_job) со своим браузером и журналом.
+
+    Возвращает сводку {"job", "rows", "seconds", "error"}.
+    """
+    manager = driver_manager.DriverManager(get_driver, name=f"{job['key']} ")
+    summary = {"job": job["key"], "rows": 0, "seconds": 0.0, "error": None}
+    started = time.perf_counter()
+    key, mode = job["key"], job["mode"]
     try:
         print("=" * 60)
         print("ПАРСЕР ОБЪЯВЛЕНИЙ ОФИСОВ (ПРОДАЖА & АРЕНДА)")
         print("ЦИАН (cat.php, region, p)")
         print("=" * 60)
 
-        mode, test_pages, city_info = resolve_settings()
-        region_id = city_info["region"]
+        print(f"\nАвторежим: {mode.upper()}, город: {job['name']}, тип сделки: {job['sale']}")
+        print(f"Страниц (для test): {job['max_pages'] or 'все'}")
+        print(f"Загрузка детальных страниц: {FETCH_MODE}, телефоны: {PHONE_MODE}")
 
-        print(f"\nАвторежим: {mode.upper()}, город: {city_info['name']}, тип сделки: {SALE}")
-        print(f"Страниц (для test): {test_pages or 'все'}")
+        existing_links = load_existing_links(job)
 
-        existing_links = load_existing_links()
+        crawl_journal.init_journal()
+        if RECORD_HTML:
+            html_archive.init_archive()
+        last_page, collection_done = crawl_journal.get_progress(key)
+        if mode == "incremental":
+            # Инкрементальный обход всегда идёт с первой страницы свежей выдачи
+            last_page, collection_done = 0, False
+        elif collection_done and crawl_journal.count_unfinished(key) == 0:
+            # Прошлый обход завершён полностью — начинаем новый с первой страницы
+            crawl_journal.reset_job(key)
+            last_page, collection_done = 0, False
 
         print("\nЗапуск браузера для сбора ссылок...")
-        driver = get_driver()
+        driver = manager.get()
 
-        print("\n" + "=" * 60)
-        print("СБОР ССЫЛОК НА ОБЪЯВЛЕНИЯ (ЦИАН)")
-        print("=" * 60)
+        cards = {} if HARVEST_CARDS else None
 
-        all_links = collect_cian_links(
-            driver,
-            region_id=region_id,
-            mode=mode,
-            max_pages=test_pages,
-        )
+        if collection_done:
+            print(f"\n✓ Сбор ссылок уже завершён (журнал, страниц: {last_page}), продолжаем парсинг")
+        else:
+            print("\n" + "=" * 60)
+            print("СБОР ССЫЛОК НА ОБЪЯВЛЕНИЯ (ЦИАН)")
+            print("=" * 60)
+            if last_page and not SHARDED:
+                print(f"Продолжаем сбор со страницы {last_page + 1} (по журналу)")
+
+        def collect(push=None):
+            """Сбор ссылок выбранным способом; push(links) — после записи каждой страницы в журнал."""
+            def on_links(links):
+                crawl_journal.add_links(key, links)
+                if push:
+                    push(links)
+
+            def on_page(page, links):
+                crawl_journal.record_page(key, page, links)
+                if push:
+                    push(links)
+
+            if mode == "incremental":
+                high_water = crawl_journal.get_high_water(key)
+                known = existing_links | crawl_journal.known_links(key)
+                print(f"Известных объявлений: {len(known)}, отметка id: {high_water or 'нет'}")
+                links = collect_cian_links(
+                    driver,
+                    job,
+                    filters={"sort": "creation_date_desc"},
+                    on_page=lambda page, links: on_links(links),
+                    cards=cards,
+                    known=known,
+                    high_water=high_water,
+                )
+                ids = [offer_id_from_url(u) for u in links]
+                ids = [i for i in ids if i]
+                if ids:
+                    crawl_journal.set_high_water(key, max(ids))
+            elif SHARDED:
+                collect_links_sharded(manager, job, workers=WORKERS, on_links=on_links, cards=cards)
+                crawl_journal.finish_collection(key)
+            else:
+                collect_cian_links(
+                    driver,
+                    job,
+                    max_pages=job["max_pages"],
+                    start_page=last_page + 1,
+                    on_page=on_page,
+                    on_complete=lambda: crawl_journal.finish_collection(key),
+                    cards=cards,
+                )
+
+        if STREAMING and not collection_done:
+            print("\n" + "=" * 60)
+            print("КОНВЕЙЕР: СБОР ССЫЛОК И ПАРСИНГ ОДНОВРЕМЕННО (ЦИАН)")
+            print("=" * 60)
+            summary["rows"] = crawl_streaming(
+                collect, job, existing_links, pending=crawl_journal.pending_links(key), workers=WORKERS, cards=cards,
+            )
+            finish_run(job, summary["rows"])
+            return summary
+
+        if not collection_done:
+            collect()
 
+        all_links = crawl_journal.pending_links(key)
         if not all_links:
-            print("\n✗ Ссылки не найдены, работа завершена.")
-            return
+            print("\n✗ Ссылок для парсинга нет, работа завершена.")
+            return summary
 
+        already_saved = [u for u in all_links if u in existing_links]
+        crawl_journal.mark_done(already_saved)
         links_to_parse = [u for u in all_links if u not in existing_links]
 
-        print(f"\nВсего найдено ссылок: {len(all_links)}")
+        print(f"\nСсылок к парсингу по журналу: {len(all_links)}")
         print(f"Из них новых (ещё нет в таблице): {len(links_to_parse)}")
 
         if not links_to_parse:
             print("\n✓ Новых объявлений нет, всё уже в таблице.")
-            return
-
-        print("\n" + "=" * 60)
-        print("ПАРСИНГ ДЕТАЛЬНЫХ СТРАНИЦ (ЦИАН)")
-        print("=" * 60)
+            return summary
 
-        total = len(links_to_parse)
-        rows_to_save = []
         total_parsed = 0
-
-        for idx, url in enumerate(links_to_parse, 1):
-            row = parse_cian_page(driver, url, idx, total)
-            if row:
-                rows_to_save.append(row)
-
-            # Сохраняем каждые 10 объявлений
-            if len(rows_to_save) >= 10:
-                append_rows_to_csv(rows_to_save)
-                total_parsed += len(rows_to_save)
-                rows_to_save = []
-
-        # Сохраняем оставшиеся
-        if rows_to_save:
-            append_rows_to_csv(rows_to_save)
-            total_parsed += len(rows_to_save)
-
-        print(f"\n{'=' * 60}")
-        print("✓ ПАРСИНГ ЗАВЕРШЁН")
-        print(f"✓ Всего новых объявлений сохранено: {total_parsed}")
-        print(f"✓ Файл с данными: {OUTPUT_FILE}")
-        print(f"{'=' * 60}")
+        if cards:
+            card_rows = [cards[u] for u in links_to_parse if card_is_complete(cards.get(u))]
+            if card_rows:
+                print(f"\nПолных карточек (без детальной страницы): {len(card_rows)}")
+                for i in range(0, len(card_rows), BATCH_SIZE):
+                    batch = card_rows[i:i + BATCH_SIZE]
+                    save_rows(batch, job)
+                    crawl_journal.mark_done([r["Ссылка"] for r in batch])
+                total_parsed += len(card_rows)
+                done_urls = {r["Ссылка"] for r in card_rows}
+                links_to_parse = [u for u in links_to_parse if u not in done_urls]
+
+        if links_to_parse:
+            print("\n" + "=" * 60)
+            print("ПАРСИНГ ДЕТАЛЬНЫХ СТРАНИЦ (ЦИАН)")
+            print("=" * 60)
+
+            total_parsed += parse_links_parallel(manager, links_to_parse, job, workers=WORKERS, cards=cards)
+
+        summary["rows"] = total_parsed
+        finish_run(job, total_parsed)
 
     except KeyboardInterrupt:
+        summary["error"] = "прервано"
         print("\n\n⚠ Парсинг прерван пользователем")
     except Exception as e:
-        print(f"\n✗ Критическая ошибка: {e}")
+        summary["error"] = str(e)
+        print(f"\n✗ Критическая ошибка ({key}): {e}")
         import traceback
         traceback.print_exc()
     finally:
-        if driver:
+        if manager.driver is not None:
             print("\nЗакрываем браузер...")
-            driver.quit()
+        manager.close()
+        summary["seconds"] = time.perf_counter() - started
         print("Готово!")
+    return summary
+
+
+def main():
+    """Обход задания из настроек модуля (CITY_NAME, SALE, MODE, PAGES_LIMIT)."""
+    summary = run_job(make_job())
+    throttle.print_summary()
+    return summary
 
 
 if __name__ == "__main__":
@@ -0,0 +1,276 @@
+"""
+HTTP-загрузка детальных страниц ЦИАН без браузера.
+
+Страница объявления отдаётся сервером уже с данными: они лежат во встроенном
+состоянии `window._cianConfig['frontend-offer-card']` и в разметке.
+Функции разбора принимают готовый HTML, поэтому их можно проверять офлайн
+на сохранённых страницах.
+"""
+import json
+import re
+import threading
+from html import unescape
+from html.parser import HTMLParser
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import throttle
+
+HTTP_TIMEOUT = 10
+HTTP_POOL_SIZE = 16
+PAGE_TEXT_LIMIT = 3000  # сколько видимого текста проверять на капчу (как PAGE_CHECK_SCRIPT в throttle.py)
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "ru-RU,ru;q=0.9,en;q=0.8",
+}
+
+_local = threading.local()
+
+
+def get_session():
+    """Возвращает HTTP-сессию текущего потока с пулом keep-alive соединений."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE, max_retries=1)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update(HEADERS)
+        _local.session = session
+    return session
+
+
+def fetch_page(url, timeout=HTTP_TIMEOUT):
+    """Загружает страницу в темпе throttle. Возвращает (HTTP-статус, HTML); при сетевой ошибке — (None, None)."""
+    started = throttle.wait(url)
+    try:
+        resp = get_session().get(url, timeout=timeout)
+    except requests.RequestException as e:
+        throttle.report(url, started, throttle.ERROR)
+        print(f" ⚠ HTTP ошибка: {e}")
+        return None, None
+    resp.encoding = resp.encoding or "utf-8"
+    outcome = throttle.report(url, started, throttle.classify(resp.status_code, visible_text(resp.text)))
+    if outcome in (throttle.CHALLENGE, throttle.BLOCKED):
+        print(f" ⚠ Страница-проверка (капча/блокировка), HTTP {resp.status_code}")
+        return resp.status_code, None
+    return resp.status_code, resp.text
+
+
+def fetch_html(url, timeout=HTTP_TIMEOUT):
+    """Загружает страницу. Возвращает HTML или None при ошибке/не-200."""
+    status, html = fetch_page(url, timeout=timeout)
+    if status is None:
+        return None
+    if status != 200:
+        print(f" ⚠ HTTP {status}")
+        return None
+    return html
+
+
+# ================== ВСТРОЕННОЕ СОСТОЯНИЕ ==================
+
+_STATE_RE = re.compile(r"_cianConfig\['frontend-offer-card'\]\s*=.*?\.concat\(", re.S)
+
+
+def extract_offer_state(html):
+    """Достаёт объект offer из встроенного состояния страницы (или None)."""
+    if not html:
+        return None
+    decoder = json.JSONDecoder()
+    for m in _STATE_RE.finditer(html):
+        try:
+            items, _ = decoder.raw_decode(html, m.end())
+        except ValueError:
+            continue
+        if not isinstance(items, list):
+            continue
+        for item in items:
+            if not isinstance(item, dict) or item.get("key") != "defaultState":
+                continue
+            value = item.get("value") or {}
+            offer = (value.get("offerData") or {}).get("offer")
+            if isinstance(offer, dict):
+                return offer
+    return None
+
+
+def _state_address(offer):
+    geo = offer.get("geo") or {}
+    if geo.get("userInput"):
+        return geo["userInput"]
+    parts = [a.get("fullName") or a.get("name") for a in geo.get("address") or [] if isinstance(a, dict)]
+    return ", ".join(p for p in parts if p)
+
+
+def _state_phone(offer):
+    for phone in offer.get("phones") or []:
+        if isinstance(phone, dict) and phone.get("number"):
+            return f"+{phone.get('countryCode') or '7'}{phone['number']}"
+    return ""
+
+
+def fields_from_state(offer):
+    """Переводит offer в сырые текстовые поля (тот же формат, что у разметки)."""
+    terms = offer.get("bargainTerms") or {}
+    price = terms.get("priceRur") or terms.get("price")
+    building = offer.get("building") or {}
+    floor = offer.get("floorNumber")
+    floors_total = building.get("floorsCount")
+
+    fields = {
+        "price": str(price) if price else "",
+        "address": _state_address(offer),
+        "title": offer.get("title") or offer.get("formattedFullInfo") or "",
+        "area": f"Площадь {offer['totalArea']} м²" if offer.get("totalArea") else "",
+        "floor": f"Этаж {floor} из {floors_total}" if floor is not None and floors_total else "",
+        "body": "",
+        "phone": _state_phone(offer),
+    }
+    if not fields["title"] and offer.get("officeType") == "office":
+        fields["title"] = "Офис"
+    return fields
+
+
+# ================== РАЗМЕТКА ==================
+
+_TEXT_KEYS = {
+    "price": [("data-testid", "price-amount"), ("data-mark", "MainPrice"), ("itemprop", "price")],
+    "address": [("data-testid", "address"), ("data-name", "Address"), ("itemprop", "address")],
+    "title": [("data-testid", "object-title"), ("data-name", "OfferTitle")],
+}
+_SKIP_TAGS = {"script", "style", "noscript", "template"}
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+
+class _DetailHTMLParser(HTMLParser):
+    """Собирает тексты элементов с известными атрибутами, h1 и весь текст body."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.texts = {}
+        self.body_parts = []
+        self._stack = []  # [(tag, field_or_None)]
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _VOID_TAGS:
+            return
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+        attrs = dict(attrs)
+        field = None
+        for name, pairs in _TEXT_KEYS.items():
+            if name in self.texts:
+                continue
+            if any(attrs.get(a) == v for a, v in pairs):
+                field = name
+                break
+        if field is None and tag == "h1" and "title" not in self.texts:
+            field = "title"
+        if field:
+            self.texts[field] = ""
+        self._stack.append((tag, field))
+
+    def handle_endtag(self, tag):
+        if tag in _VOID_TAGS:
+            return
+        if tag in _SKIP_TAGS and self._skip:
+            self._skip -= 1
+        # Закрываем до ближайшего совпадающего тега (разметка бывает кривой)
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                del self._stack[i:]
+                break
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        self.body_parts.append(data)
+        for _, field in self._stack:
+            if field:
+                self.texts[field] += data
+
+
+def _squash(text):
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def visible_text(html, limit=PAGE_TEXT_LIMIT):
+    """Видимый текст страницы: заголовок и body без script/style (как innerText в браузере).
+
+    Маркеры капчи и снятого объявления ищутся только в нём: во встроенном JSON
+    и JS-бандлах те же слова встречаются и на обычных страницах.
+    """
+    if not html:
+        return ""
+    parser = _DetailHTMLParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        pass
+    text = "\n".join(_squash(p) for p in parser.body_parts if p.strip())
+    return text[:limit] if limit else text
+
+
+def fields_from_markup(html):
+    """Разбирает сырые текстовые поля из серверной разметки."""
+    parser = _DetailHTMLParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        pass
+    body = "\n".join(_squash(p) for p in parser.body_parts if p.strip())
+
+    fields = {key: _squash(parser.texts.get(key)) for key in ("price", "address", "title")}
+    m = re.search(r"Площадь[^\n]{0,40}?\n?[^\n]*?м²", body)
+    fields["area"] = m.group(0) if m else ""
+    m = re.search(r"Этаж\s*\n?\s*-?\d+\s*из\s*\d+", body)
+    fields["floor"] = m.group(0) if m else ""
+    fields["body"] = body
+    m = re.search(r'href="tel:([^"]+)"', html)
+    fields["phone"] = unescape(m.group(1)) if m else ""
+    return fields
+
+
+_REMOVED_MARKERS = ("объявление снято с публикации", "объявление удалено", "снято с публикации")
+
+
+def is_offer_removed(html):
+    """Признак снятого с публикации объявления.
+
+    Если на странице есть встроенное состояние, решает только offer.status.
+    Без состояния маркеры ищутся в видимом тексте (без скриптов): во встроенном
+    JSON и блоке похожих объявлений «снято с публикации» бывает и у живой страницы.
+    """
+    offer = extract_offer_state(html)
+    if offer:
+        return str(offer.get("status") or "").lower() in ("deactivated", "removed", "deleted", "blocked")
+    lower = visible_text(html, limit=None).lower()
+    return any(marker in lower for marker in _REMOVED_MARKERS)
+
+
+def extract_detail_fields(html):
+    """Сырые поля детальной страницы: сначала встроенное состояние, потом разметка.
+
+    Возвращает словарь price/address/title/area/floor/body/phone (тексты) или None,
+    если страница пустая.
+    """
+    if not html:
+        return None
+    offer = extract_offer_state(html)
+    fields = fields_from_markup(html)
+    if offer:
+        state_fields = fields_from_state(offer)
+        for key, value in state_fields.items():
+            if value:
+                fields[key] = value
+    return fields
@@ -0,0 +1,165 @@
+"""
+Обход ЦИАН по матрице заданий (город × тип сделки).
+
+Задания и настройки берутся из JSON-файла (--config) и аргументов командной
+строки (аргументы важнее файла, файл — настроек cian.py). Задания идут
+одновременно в --parallel потоках: у каждого свой браузер, журнал и CSV,
+темп запросов к сайту общий (throttle.py). В конце — одна сводка по всем
+заданиям: сохранено строк и строк в секунду.
+
+    python parser/crawl.py --city chelyabinsk ekaterinburg --deal rent sale --parallel 2
+    python parser/crawl.py --config parser/crawl_config.json
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+
+import cian
+import throttle
+
+PARALLEL_JOBS = 2  # заданий одновременно (у каждого ещё WORKERS браузеров на детальные страницы)
+
+# Ключ конфига/аргумента → настройка cian.py (общая для всех заданий запуска)
+SETTINGS = {
+    "workers": "WORKERS",
+    "fetch_mode": "FETCH_MODE",
+    "phone_mode": "PHONE_MODE",
+    "streaming": "STREAMING",
+    "sharded": "SHARDED",
+    "storage": "STORAGE",
+    "headless": "HEADLESS",
+    "record_html": "RECORD_HTML",
+    "base_url": "BASE_URL",
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Обход ЦИАН по нескольким городам и типам сделки")
+    parser.add_argument("--config", help="JSON-файл с заданиями и настройками")
+    parser.add_argument("--city", nargs="+", help="города из CITY_REGIONS (или all)")
+    parser.add_argument("--deal", nargs="+", choices=["rent", "sale"], help="типы сделки")
+    parser.add_argument("--mode", choices=["test", "full", "incremental"])
+    parser.add_argument("--pages", type=int, help="лимит страниц выдачи в режиме test")
+    parser.add_argument("--parallel", type=int, help=f"заданий одновременно (по умолчанию {PARALLEL_JOBS})")
+    parser.add_argument("--workers", type=int, help="браузеров на детальные страницы в каждом задании")
+    parser.add_argument("--fetch-mode", dest="fetch_mode", choices=["browser", "http"])
+    parser.add_argument("--phone-mode", dest="phone_mode", choices=["inline", "deferred"])
+    parser.add_argument("--streaming", action="store_true", default=None, help="конвейер сбор → парсинг → запись")
+    parser.add_argument("--sharded", action="store_true", default=None, help="шардированный сбор ссылок")
+    return parser, parser.parse_args(argv)
+
+
+def load_config(path):
+    """Читает JSON-конфиг запуска (пустой словарь, если файл не задан)."""
+    if not path:
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_jobs(config):
+    """Список заданий: явный "jobs" из конфига или произведение cities × deals."""
+    mode, pages = config.get("mode"), config.get("pages")
+    if config.get("jobs"):
+        return [
+            cian.make_job(
+                spec.get("city"), spec.get("deal"), spec.get("mode") or mode,
+                spec.get("pages") if spec.get("pages") is not None else pages,
+            )
+            for spec in config["jobs"]
+        ]
+
+    cities = config.get("cities") or [cian.CITY_NAME]
+    if "all" in cities:
+        cities = list(cian.CITY_REGIONS)
+    deals = config.get("deals") or [cian.SALE]
+    return [cian.make_job(city, deal, mode, pages) for city in cities for deal in deals]
+
+
+def apply_settings(config):
+    """Переносит общие настройки запуска в cian.py."""
+    for key, name in SETTINGS.items():
+        if config.get(key) is not None:
+            setattr(cian, name, config[key])
+
+
+def run_matrix(jobs, parallel=PARALLEL_JOBS):
+    """Запускает задания пулом потоков. Возвращает (сводки в порядке заданий, общее время)."""
+    tasks = queue.Queue()
+    for idx, job in enumerate(jobs):
+        tasks.put((idx, job))
+    summaries = [None] * len(jobs)
+
+    def worker():
+        while True:
+            try:
+                idx, job = tasks.get_nowait()
+            except queue.Empty:
+                break
+            summaries[idx] = cian.run_job(job)
+
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=worker, name=f"cian-job-{i}", daemon=True)
+        for i in range(1, max(1, min(parallel, len(jobs))) + 1)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summaries, time.perf_counter() - started
+
+
+def print_matrix_summary(summaries, wall_time):
+    """Итоговая сводка по всем заданиям."""
+    print(f"\n{'=' * 60}")
+    print("СВОДКА ПО ЗАДАНИЯМ")
+    print(f"{'=' * 60}")
+    total_rows = 0
+    for summary in summaries:
+        if not summary:
+            continue
+        total_rows += summary["rows"]
+        rate = summary["rows"] / summary["seconds"] if summary["seconds"] > 0 else 0.0
+        status = f", ошибка: {summary['error']}" if summary["error"] else ""
+        print(
+            f" {summary['job']:<22} строк {summary['rows']:>5}, {summary['seconds']:7.1f} с, "
+            f"{rate:.2f} строк/с{status}"
+        )
+    rate = total_rows / wall_time if wall_time > 0 else 0.0
+    print(f" Итого: {total_rows} строк за {wall_time:.1f} с ({rate:.2f} строк/с)")
+    throttle.print_summary()
+
+
+def main(argv=None):
+    parser, args = parse_args(argv)
+    config = load_config(args.config)
+    # Аргументы командной строки важнее файла
+    overrides = {
+        "cities": args.city,
+        "deals": args.deal,
+        "mode": args.mode,
+        "pages": args.pages,
+        "parallel": args.parallel,
+    }
+    overrides.update({key: getattr(args, key, None) for key in SETTINGS})
+    config.update({key: value for key, value in overrides.items() if value is not None})
+    if args.city or args.deal:
+        config.pop("jobs", None)
+
+    try:
+        jobs = build_jobs(config)
+    except ValueError as e:
+        parser.error(str(e))
+    apply_settings(config)
+
+    parallel = config.get("parallel") or PARALLEL_JOBS
+    print(f"Заданий: {len(jobs)} ({', '.join(job['key'] for job in jobs)}), одновременно: {parallel}")
+    summaries, wall_time = run_matrix(jobs, parallel)
+    print_matrix_summary(summaries, wall_time)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Журнал обхода ЦИАН (SQLite).
+
+Хранит собранные ссылки, статус их парсинга, число попыток и последнюю
+пройденную страницу поиска, чтобы после падения продолжить с того же места.
+"""
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+JOURNAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "crawl_journal.sqlite3")
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 60  # секунд; задержка перед повтором = BACKOFF_BASE * 2 ** (попытка - 1)
+
+
+def get_connection():
+    # Задания crawl.py пишут в журнал одновременно: WAL и ожидание блокировки вместо "database is locked"
+    conn = sqlite3.connect(JOURNAL_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    return conn
+
+
+def init_journal():
+    """Создаёт таблицы журнала."""
+    conn = get_connection()
+    cur = conn.cursor()
+
+    # Ссылки на объявления и статус их парсинга
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS links (
+        url TEXT PRIMARY KEY,
+        job TEXT,
+        status TEXT DEFAULT 'pending',  -- pending / done / failed
+        attempts INTEGER DEFAULT 0,
+        last_error TEXT,
+        next_attempt_at REAL DEFAULT 0,
+        updated_at TIMESTAMP
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_links_job_status ON links (job, status);")
+
+    # Прогресс сбора ссылок по заданиям (город + тип сделки)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS progress (
+        job TEXT PRIMARY KEY,
+        last_page INTEGER DEFAULT 0,
+        collection_done INTEGER DEFAULT 0,
+        updated_at TIMESTAMP
+    );
+    """)
+
+    # Самый свежий id объявления по заданию (для инкрементального обхода)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS high_water (
+        job TEXT PRIMARY KEY,
+        offer_id INTEGER,
+        updated_at TIMESTAMP
+    );
+    """)
+
+    # Состояние уже сохранённых объявлений (для обновления устаревших)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS listing_state (
+        url TEXT PRIMARY KEY,
+        price TEXT,
+        active INTEGER DEFAULT 1,
+        last_checked REAL DEFAULT 0
+    );
+    """)
+
+    # История изменений цены и статуса
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS price_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        url TEXT,
+        old_price TEXT,
+        new_price TEXT,
+        old_active INTEGER,
+        new_active INTEGER,
+        checked_at TIMESTAMP
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_price_history_url ON price_history (url);")
+
+    conn.commit()
+    conn.close()
+
+
+def job_key(city_key, sale):
+    """Ключ задания обхода."""
+    return f"{city_key}_{sale}"
+
+
+# --- Прогресс сбора ссылок ---
+
+def get_progress(job):
+    """Возвращает (последняя пройденная страница, сбор завершён)."""
+    conn = get_connection()
+    row = conn.execute("SELECT last_page, collection_done FROM progress WHERE job = ?", (job,)).fetchone()
+    conn.close()
+    if not row:
+        return 0, False
+    return row["last_page"], bool(row["collection_done"])
+
+
+def set_progress(job, last_page, collection_done=False):
+    conn = get_connection()
+    conn.execute("""
+    INSERT INTO progress (job, last_page, collection_done, updated_at)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(job) DO UPDATE SET
+        last_page = excluded.last_page,
+        collection_done = excluded.collection_done,
+        updated_at = excluded.updated_at
+    """, (job, last_page, int(collection_done), datetime.now()))
+    conn.commit()
+    conn.close()
+
+
+def record_page(job, page, urls):
+    """Атомарно сохраняет ссылки страницы поиска и номер этой страницы."""
+    now = datetime.now()
+    conn = get_connection()
+    with conn:
+        conn.executemany("""
+        INSERT OR IGNORE INTO links (url, job, status, updated_at)
+        VALUES (?, ?, 'pending', ?)
+        """, [(url, job, now) for url in urls])
+        conn.execute("""
+        INSERT INTO progress (job, last_page, collection_done, updated_at)
+        VALUES (?, ?, 0, ?)
+        ON CONFLICT(job) DO UPDATE SET
+            last_page = excluded.last_page,
+            updated_at = excluded.updated_at
+        """, (job, page, now))
+    conn.close()
+
+
+def add_links(job, urls):
+    """Добавляет ссылки без привязки к странице поиска (шарды, инкрементальный обход)."""
+    now = datetime.now()
+    conn = get_connection()
+    with conn:
+        conn.executemany("""
+        INSERT OR IGNORE INTO links (url, job, status, updated_at)
+        VALUES (?, ?, 'pending', ?)
+        """, [(url, job, now) for url in urls])
+    conn.close()
+
+
+def known_links(job):
+    """Все ссылки задания, когда-либо попавшие в журнал."""
+    conn = get_connection()
+    rows = conn.execute("SELECT url FROM links WHERE job = ?", (job,)).fetchall()
+    conn.close()
+    return {row["url"] for row in rows}
+
+
+def get_high_water(job):
+    """Максимальный id объявления, виденный в задании (0, если обходов не было)."""
+    conn = get_connection()
+    row = conn.execute("SELECT offer_id FROM high_water WHERE job = ?", (job,)).fetchone()
+    conn.close()
+    return row["offer_id"] if row else 0
+
+
+def set_high_water(job, offer_id):
+    """Сдвигает отметку вперёд (назад никогда не двигается)."""
+    conn = get_connection()
+    conn.execute("""
+    INSERT INTO high_water (job, offer_id, updated_at)
+    VALUES (?, ?, ?)
+    ON CONFLICT(job) DO UPDATE SET
+        offer_id = MAX(high_water.offer_id, excluded.offer_id),
+        updated_at = excluded.updated_at
+    """, (job, offer_id, datetime.now()))
+    conn.commit()
+    conn.close()
+
+
+def finish_collection(job):
+    """Отмечает, что сбор ссылок по заданию дошёл до конца выдачи."""
+    last_page, _ = get_progress(job)
+    set_progress(job, last_page, collection_done=True)
+
+
+# --- Статус парсинга ---
+
+def pending_links(job, max_attempts=MAX_ATTEMPTS):
+    """Ссылки, которые пора парсить: новые и упавшие, у которых истёк backoff."""
+    conn = get_connection()
+    rows = conn.execute("""
+    SELECT url FROM links
+    WHERE job = ?
+      AND (status = 'pending'
+           OR (status = 'failed' AND attempts < ? AND next_attempt_at <= ?))
+    ORDER BY status DESC, url
+    """, (job, max_attempts, time.time())).fetchall()
+    conn.close()
+    return [row["url"] for row in rows]
+
+
+def count_unfinished(job, max_attempts=MAX_ATTEMPTS):
+    """Сколько ссылок ещё не спарсено (включая ждущие повтора)."""
+    conn = get_connection()
+    row = conn.execute("""
+    SELECT COUNT(*) AS n FROM links
+    WHERE job = ? AND (status = 'pending' OR (status = 'failed' AND attempts < ?))
+    """, (job, max_attempts)).fetchone()
+    conn.close()
+    return row["n"]
+
+
+def mark_done(urls):
+    """Отмечает ссылки как успешно сохранённые."""
+    if not urls:
+        return
+    now = datetime.now()
+    conn = get_connection()
+    with conn:
+        conn.executemany("""
+        UPDATE links SET status = 'done', attempts = attempts + 1, last_error = NULL, updated_at = ?
+        WHERE url = ?
+        """, [(now, url) for url in urls])
+    conn.close()
+
+
+def mark_failed(url, error="", permanent=False):
+    """Фиксирует неудачную попытку и назначает время повтора с backoff.
+
+    error — класс сбоя (см. failures.py); permanent=True — больше не повторять.
+    """
+    conn = get_connection()
+    with conn:
+        row = conn.execute("SELECT attempts FROM links WHERE url = ?", (url,)).fetchone()
+        attempts = (row["attempts"] if row else 0) + 1
+        if permanent:
+            attempts = max(attempts, MAX_ATTEMPTS)
+        next_attempt_at = time.time() + BACKOFF_BASE * 2 ** (attempts - 1)
+        conn.execute("""
+        UPDATE links SET status = 'failed', attempts = ?, last_error = ?, next_attempt_at = ?, updated_at = ?
+        WHERE url = ?
+        """, (attempts, error, next_attempt_at, datetime.now(), url))
+    conn.close()
+
+
+def reset_job(job):
+    """Начинает задание заново: сбор ссылок с первой страницы."""
+    set_progress(job, 0, collection_done=False)
+
+
+# --- Обновление сохранённых объявлений ---
+
+def get_listing_states():
+    """Возвращает {url: {price, active, last_checked}}."""
+    conn = get_connection()
+    rows = conn.execute("SELECT url, price, active, last_checked FROM listing_state").fetchall()
+    conn.close()
+    return {row["url"]: dict(row) for row in rows}
+
+
+def record_check(url, old_price, new_price, old_active, new_active):
+    """Фиксирует проверку объявления; изменения цены/статуса пишет в историю.
+
+    old_price=None — прежняя цена неизвестна: первая цена изменением не считается.
+    """
+    now = datetime.now()
+    conn = get_connection()
+    with conn:
+        conn.execute("""
+        INSERT INTO listing_state (url, price, active, last_checked)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(url) DO UPDATE SET
+            price = excluded.price,
+            active = excluded.active,
+            last_checked = excluded.last_checked
+        """, (url, new_price, int(new_active), time.time()))
+        price_changed = old_price is not None and old_price != new_price
+        if price_changed or bool(old_active) != bool(new_active):
+            conn.execute("""
+            INSERT INTO price_history (url, old_price, new_price, old_active, new_active, checked_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """, (url, old_price, new_price, int(old_active), int(new_active), now))
+    conn.close()
+
+
+def inactive_links():
+    """Ссылки объявлений, снятых с публикации."""
+    conn = get_connection()
+    rows = conn.execute("SELECT url FROM listing_state WHERE active = 0").fetchall()
+    conn.close()
+    return {row["url"] for row in rows}
@@ -0,0 +1,73 @@
+"""
+Поиск повторно выложенных объявлений (одно помещение под разными id ЦИАН).
+
+Отпечаток объявления — нормализованный адрес (город + улица + дом), этаж,
+корзина площади и ценовая полоса. Объявления с одинаковым адресом и этажом и
+соседними корзинами площади/цены считаются одним помещением и получают общий
+cluster_id (id первого увиденного объявления). Поиск идёт по индексу
+listings (addr_key, floor, area_bucket) в listing_store.py; в CSV для бота
+выгружается по одному объявлению на кластер.
+"""
+import math
+import re
+
+AREA_STEP = 1.0  # м² в одной корзине площади; сравниваются соседние корзины
+PRICE_BAND_RATIO = 1.1  # ширина ценовой полосы (10%); сравниваются соседние полосы
+
+_STREET_WORDS_RE = re.compile(
+    r"\b(ул|улица|пр|просп|проспект|пр-т|пер|переулок|наб|набережная|бул|бульвар|ш|шоссе|"
+    r"пл|площадь|проезд|пр-д|тракт|аллея|д|дом)\b\.?",
+    re.IGNORECASE,
+)
+_NON_WORD_RE = re.compile(r"[^0-9a-zа-я/]+")
+_HOUSE_PARTS_RE = re.compile(r"(корпус|корп|к)\.?\s*(\d)|(строение|стр|с)\.?\s*(\d)", re.IGNORECASE)
+
+
+def normalize_text(text):
+    """Нижний регистр, ё → е, без типов улиц и знаков препинания."""
+    text = (text or "").lower().replace("ё", "е")
+    text = _STREET_WORDS_RE.sub(" ", text)
+    return _NON_WORD_RE.sub("", text)
+
+
+def normalize_house(house):
+    """'15 корп. 2' / '15к2' → '15к2', 'стр. 1' → 'с1'."""
+    house = (house or "").lower().replace(" ", "")
+    house = _HOUSE_PARTS_RE.sub(lambda m: f"к{m.group(2)}" if m.group(2) else f"с{m.group(4)}", house)
+    return _NON_WORD_RE.sub("", house)
+
+
+def address_key(locality, street, house):
+    """Ключ адреса (или None, если нет улицы или дома — такие объявления не склеиваются)."""
+    street_key, house_key = normalize_text(street), normalize_house(house)
+    if not street_key or not house_key:
+        return None
+    return f"{normalize_text(locality)}|{street_key}|{house_key}"
+
+
+def price_value(price):
+    """Число из цены (для диапазона "от - до" — нижняя граница)."""
+    if price is None:
+        return None
+    if isinstance(price, (int, float)):
+        return float(price) if price == price else None
+    digits = re.match(r"\D*(\d+)", str(price).replace(" ", ""))
+    return float(digits.group(1)) if digits else None
+
+
+def area_bucket(area):
+    try:
+        area = float(area)
+    except (TypeError, ValueError):
+        return None
+    return int(area // AREA_STEP) if area == area and area > 0 else None
+
+
+def price_band(price):
+    value = price_value(price)
+    return int(math.log(value, PRICE_BAND_RATIO)) if value and value > 0 else None
+
+
+def fingerprint(locality, street, house, area, price):
+    """(addr_key, area_bucket, price_band) объявления; addr_key=None — без склейки."""
+    return address_key(locality, street, house), area_bucket(area), price_band(price)
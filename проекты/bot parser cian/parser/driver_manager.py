@@ -0,0 +1,160 @@
+"""
+Менеджер жизненного цикла браузера.
+
+Долгие headless-сессии распухают по памяти, поэтому браузер перезапускается
+после RECYCLE_PAGES страниц или при превышении RECYCLE_RSS_MB. Замена готовится
+заранее (тёплый запасной браузер запускается в фоне), старый закрывается
+тоже в фоне — переключение не стоит времени обхода.
+"""
+import os
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:  # psutil необязателен: без него память читается из /proc (Linux)
+    psutil = None
+
+RECYCLE_PAGES = 200  # перезапуск после стольких страниц
+RECYCLE_RSS_MB = 1500  # ... или если браузер занял больше (МБ)
+SPARE_AT = 0.8  # запасной браузер запускается при достижении 80% любого лимита
+RSS_CHECK_EVERY = 10  # память проверяется раз в столько страниц
+
+
+def _proc_children(pid):
+    """Все потомки процесса по /proc (если нет psutil)."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    result, stack = [], [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            result.append(child)
+            stack.append(child)
+    return result
+
+
+def _proc_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def browser_rss_mb(driver):
+    """Суммарная память процесса драйвера и всех процессов браузера под ним (МБ)."""
+    try:
+        pid = driver.service.process.pid
+    except AttributeError:
+        return 0.0
+    if psutil:
+        try:
+            proc = psutil.Process(pid)
+            procs = [proc] + proc.children(recursive=True)
+            return sum(p.memory_info().rss for p in procs if p.is_running()) / (1024 * 1024)
+        except psutil.Error:
+            return 0.0
+    if not os.path.isdir("/proc"):
+        return 0.0
+    return sum(_proc_rss_mb(p) for p in [pid] + _proc_children(pid))
+
+
+def _quit_quietly(driver):
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+class DriverManager:
+    """Выдаёт рабочий браузер и незаметно подменяет его на свежий по лимитам."""
+
+    def __init__(self, launch, max_pages=RECYCLE_PAGES, max_rss_mb=RECYCLE_RSS_MB, name=""):
+        self.launch = launch
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.name = name
+        self.driver = None
+        self.pages = 0
+        self.recycles = 0
+        self._spare = None
+        self._spare_thread = None
+        self._rss = 0.0
+
+    def get(self):
+        """Текущий браузер (запускается при первом обращении)."""
+        if self.driver is None:
+            self.driver = self._take_spare() or self.launch()
+            self.pages = 0
+            self._rss = 0.0
+        return self.driver
+
+    def page_done(self, count=1):
+        """Отмечает обработанные страницы; при необходимости готовит и делает замену."""
+        if self.driver is None or count <= 0:
+            return
+        before = self.pages
+        self.pages += count
+        if self.max_rss_mb and self.pages // RSS_CHECK_EVERY != before // RSS_CHECK_EVERY:
+            self._rss = browser_rss_mb(self.driver)
+
+        pages_ratio = self.pages / self.max_pages if self.max_pages else 0
+        rss_ratio = self._rss / self.max_rss_mb if self.max_rss_mb else 0
+        if max(pages_ratio, rss_ratio) >= SPARE_AT:
+            self._start_spare()
+        if pages_ratio >= 1 or rss_ratio >= 1:
+            reason = f"{self.pages} стр." if pages_ratio >= 1 else f"{self._rss:.0f} МБ"
+            self.recycle(reason)
+
+    def recycle(self, reason=""):
+        """Меняет браузер на запасной (или свежий), старый закрывает в фоне."""
+        old = self.driver
+        self.driver = None
+        self.recycles += 1
+        print(f" ♻ Перезапуск браузера {self.name}({reason})".rstrip())
+        if old is not None:
+            threading.Thread(target=_quit_quietly, args=(old,), daemon=True).start()
+        self.get()
+
+    def _start_spare(self):
+        if self._spare is not None or (self._spare_thread and self._spare_thread.is_alive()):
+            return
+
+        def warm_up():
+            try:
+                self._spare = self.launch()
+            except Exception as e:
+                print(f" ⚠ Не удалось запустить запасной браузер: {e}")
+
+        self._spare_thread = threading.Thread(target=warm_up, daemon=True)
+        self._spare_thread.start()
+
+    def _take_spare(self):
+        if self._spare_thread is not None:
+            started = time.perf_counter()
+            self._spare_thread.join()
+            self._spare_thread = None
+            waited = time.perf_counter() - started
+            if waited > 0.5:
+                print(f" ⚠ Запасной браузер ещё запускался, ждали {waited:.1f} с")
+        spare, self._spare = self._spare, None
+        return spare
+
+    def close(self):
+        """Закрывает текущий и запасной браузеры."""
+        spare = self._take_spare()
+        for driver in (self.driver, spare):
+            if driver is not None:
+                _quit_quietly(driver)
+        self.driver = None
@@ -0,0 +1,143 @@
+"""
+Классы сбоев парсинга детальных страниц и повторы в рамках запуска.
+
+Каждая неудача получает класс (таймаут, устаревший элемент, недогруженная
+страница, капча, сеть, браузер, снятое объявление, ошибка разбора). Временные
+сбои сразу ставятся в очередь повторов с экспоненциальной задержкой
+(RETRY_BASE, 2×RETRY_BASE, ...), а не ждут следующего обхода. В конце
+печатается отчёт: сколько ссылок каждого класса удалось спасти повтором.
+"""
+import heapq
+import threading
+import time
+
+from selenium.common.exceptions import (
+    TimeoutException,
+    StaleElementReferenceException,
+    WebDriverException,
+)
+
+TIMEOUT = "timeout"
+STALE = "stale"
+INCOMPLETE = "incomplete"
+CHALLENGE = "challenge"
+NETWORK = "network"
+BROWSER = "browser"
+REMOVED = "removed"
+PARSE = "parse"
+
+DESCRIPTIONS = {
+    TIMEOUT: "таймаут загрузки",
+    STALE: "элемент устарел во время чтения",
+    INCOMPLETE: "страница догрузилась не полностью",
+    CHALLENGE: "капча/блокировка",
+    NETWORK: "сетевая ошибка",
+    BROWSER: "сбой браузера",
+    REMOVED: "объявление снято",
+    PARSE: "ошибка разбора",
+}
+RETRYABLE = {TIMEOUT, STALE, INCOMPLETE, CHALLENGE, NETWORK, BROWSER}
+
+# Признаки сетевой ошибки в сообщении WebDriverException (страница ошибки браузера)
+NETWORK_MARKERS = ("reached error page", "neterror", "net::err_", "connection refused", "dnsnotfound")
+
+RETRY_LIMIT = 3  # повторов одной ссылки за запуск
+RETRY_BASE = 2.0  # секунд до первого повтора, дальше вдвое больше
+
+
+class PageFailure(Exception):
+    """Неудача парсинга страницы с известным классом."""
+
+    def __init__(self, reason, message=""):
+        super().__init__(message or DESCRIPTIONS.get(reason, reason))
+        self.reason = reason
+
+
+def classify_exception(error):
+    """Класс сбоя по исключению."""
+    if isinstance(error, PageFailure):
+        return error.reason
+    if isinstance(error, TimeoutException):
+        return TIMEOUT
+    if isinstance(error, StaleElementReferenceException):
+        return STALE
+    if isinstance(error, WebDriverException):
+        message = str(error).lower()
+        return NETWORK if any(marker in message for marker in NETWORK_MARKERS) else BROWSER
+    return PARSE
+
+
+class RetryQueue:
+    """Общая для воркеров очередь повторов и учёт исходов по классам."""
+
+    def __init__(self, limit=RETRY_LIMIT, base=RETRY_BASE):
+        self.limit = limit
+        self.base = base
+        self._heap = []  # (время повтора, порядковый номер, idx, url)
+        self._seq = 0
+        self._failures = {}  # url -> [классы неудачных попыток]
+        self.stats = {"ok": 0, "retried": {}, "recovered": {}, "failed": {}}
+        self.lock = threading.Lock()
+
+    def schedule(self, idx, url, reason):
+        """Ставит ссылку на повтор, если класс временный и лимит не исчерпан.
+
+        Возвращает задержку до повтора (секунд) или None, если повтора не будет.
+        """
+        with self.lock:
+            attempts = self._failures.setdefault(url, [])
+            attempts.append(reason)
+            if reason not in RETRYABLE or len(attempts) > self.limit:
+                return None
+            delay = self.base * 2 ** (len(attempts) - 1)
+            self._seq += 1
+            heapq.heappush(self._heap, (time.monotonic() + delay, self._seq, idx, url))
+            self.stats["retried"][reason] = self.stats["retried"].get(reason, 0) + 1
+            return delay
+
+    def pop_due(self):
+        """(idx, url) ссылки, которой пора на повтор, или None."""
+        with self.lock:
+            if self._heap and self._heap[0][0] <= time.monotonic():
+                _, _, idx, url = heapq.heappop(self._heap)
+                return idx, url
+        return None
+
+    def next_delay(self):
+        """Секунд до ближайшего повтора (None, если повторов нет)."""
+        with self.lock:
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def record(self, url, reason=None):
+        """Фиксирует окончательный исход ссылки (reason=None — успех)."""
+        with self.lock:
+            attempts = self._failures.get(url)
+            if reason is None:
+                self.stats["ok"] += 1
+                if attempts:
+                    first = attempts[0]
+                    self.stats["recovered"][first] = self.stats["recovered"].get(first, 0) + 1
+            else:
+                self.stats["failed"][reason] = self.stats["failed"].get(reason, 0) + 1
+
+    def print_report(self):
+        """Отчёт по классам сбоев: повторов, спасено, потеряно."""
+        with self.lock:
+            stats = {key: (dict(value) if isinstance(value, dict) else value) for key, value in self.stats.items()}
+        failed_total = sum(stats["failed"].values())
+        recovered_total = sum(stats["recovered"].values())
+        total = stats["ok"] + failed_total
+        if not total:
+            return
+        print(
+            f" Итог по ссылкам: успешно {stats['ok']} из {total} ({stats['ok'] / total:.0%}), "
+            f"из них после повтора {recovered_total}"
+        )
+        reasons = set(stats["retried"]) | set(stats["recovered"]) | set(stats["failed"])
+        for reason in sorted(reasons, key=lambda r: -(stats["failed"].get(r, 0) + stats["recovered"].get(r, 0))):
+            print(
+                f"  {reason:<11} {DESCRIPTIONS.get(reason, reason)}: повторов {stats['retried'].get(reason, 0)}, "
+                f"спасено {stats['recovered'].get(reason, 0)}, потеряно {stats['failed'].get(reason, 0)}"
+            )
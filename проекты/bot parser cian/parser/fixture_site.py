@@ -0,0 +1,185 @@
+"""
+Локальный сайт-заглушка ЦИАН для нагрузочных тестов обхода.
+
+Отдаёт сгенерированные страницы выдачи `cat.php?p=N&region=...` и объявления
+`/<rent|sale>/commercial/<id>/` с кнопкой «Показать телефон» и модальным окном,
+в той же разметке, которую читают селекторы cian.py. Задержка ответа, число
+страниц выдачи и доля сбойных ответов (503 и страница-проверка) настраиваются.
+Данные объявления детерминированы его id, поэтому прогоны сравнимы.
+
+Запуск отдельно: `python parser/fixture_site.py`, затем BASE_URL в cian.py —
+адрес сервера. Прогон с замером скорости — bench_crawl.py.
+"""
+import html
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+FIXTURE_HOST = "127.0.0.1"
+FIXTURE_PORT = 8765
+FIXTURE_PAGES = 5  # страниц выдачи на регион и тип сделки
+FIXTURE_PER_PAGE = 28  # объявлений на странице выдачи
+FIXTURE_LATENCY = 0.05  # секунд задержки ответа (± FIXTURE_JITTER)
+FIXTURE_JITTER = 0.02
+FIXTURE_FAIL_RATE = 0.0  # доля ответов 503
+FIXTURE_CAPTCHA_RATE = 0.0  # доля страниц-проверок «подтвердите, что вы не робот»
+
+STREETS = ["ул. Ленина", "пр. Победы", "ул. Кирова", "ул. Труда", "Свердловский пр.", "ул. Мира"]
+DISTRICTS = ["Центральный", "Калининский", "Курчатовский", "Ленинский", "Советский"]
+
+_rng = random.Random()
+_rng_lock = threading.Lock()
+
+
+def offer_ids(region, sale, page):
+    """Id объявлений на странице выдачи (у каждого региона и сделки свой диапазон)."""
+    base = (int(region or 0) % 1000) * 1_000_000 + (0 if sale == "rent" else 500_000)
+    start = base + (page - 1) * FIXTURE_PER_PAGE + 1
+    return range(start, start + FIXTURE_PER_PAGE)
+
+
+def offer_data(offer_id, sale):
+    """Детерминированные поля объявления."""
+    rnd = random.Random(offer_id)
+    area = rnd.choice([18, 25, 32.5, 40, 56, 75, 120, 210])
+    floors_total = rnd.randint(2, 25)
+    price = int(area * (rnd.randint(600, 1500) if sale == "rent" else rnd.randint(60_000, 150_000)))
+    return {
+        "id": offer_id,
+        "title": rnd.choice(["Офис", "Свободного назначения"]) + f", {area} м²",
+        "office": rnd.random() < 0.7,
+        "price": price,
+        "area": area,
+        "floor": rnd.randint(1, floors_total),
+        "floors_total": floors_total,
+        "address": f"Челябинская область, Челябинск, р-н {rnd.choice(DISTRICTS)}, "
+                   f"{rnd.choice(STREETS)}, {rnd.randint(1, 150)}",
+        "phone": f"+7 912 {rnd.randint(100, 999)}-{rnd.randint(10, 99)}-{rnd.randint(10, 99)}",
+    }
+
+
+def _money(value):
+    return f"{value:,}".replace(",", " ") + " ₽"
+
+
+def render_search(region, sale, page):
+    if page > FIXTURE_PAGES:
+        return "<html><head><title>Ничего не найдено</title></head><body><h1>Ничего не найдено</h1></body></html>"
+    articles = []
+    for offer_id in offer_ids(region, sale, page):
+        o = offer_data(offer_id, sale)
+        geo = "".join(f"<span data-name='GeoLabel'>{html.escape(p.strip())}</span>" for p in o["address"].split(","))
+        articles.append(f"""
+<article data-name="CardComponent">
+  <a href="/{sale}/commercial/{offer_id}/"><span data-mark="OfferTitle">{html.escape(o['title'])}</span></a>
+  <span data-mark="MainPrice">{_money(o['price'])}{'/мес.' if sale == 'rent' else ''}</span>
+  <div>{geo}</div>
+  <div>{o['area']} м² · {o['floor']}/{o['floors_total']} этаж</div>
+</article>""")
+    return f"""<html><head><title>Коммерческая недвижимость — страница {page}</title></head>
+<body><main>{''.join(articles)}</main></body></html>"""
+
+
+def render_detail(offer_id, sale):
+    o = offer_data(offer_id, sale)
+    state = [{"key": "defaultState", "value": {"offerData": {"offer": {
+        "id": offer_id,
+        "title": o["title"],
+        "officeType": "office" if o["office"] else "freeAppointment",
+        "totalArea": o["area"],
+        "floorNumber": o["floor"],
+        "building": {"floorsCount": o["floors_total"]},
+        "bargainTerms": {"priceRur": o["price"]},
+        "geo": {"userInput": o["address"]},
+        "status": "published",
+    }}}}]
+    phone = html.escape(o["phone"])
+    return f"""<html><head><title>{html.escape(o['title'])}</title></head>
+<body>
+<h1 data-testid="object-title">{html.escape(o['title'])}</h1>
+<div data-testid="price-amount">{_money(o['price'])}{'/мес.' if sale == 'rent' else ''}</div>
+<div data-testid="address">{html.escape(o['address'])}</div>
+<ul>
+  <li><span>Площадь</span> <span>{o['area']} м²</span></li>
+  <li><span>Этаж</span> <span>{o['floor']} из {o['floors_total']}</span></li>
+</ul>
+<button data-testid="phone-button" onclick="document.getElementById('phone-modal').style.display='block'">Показать телефон</button>
+<div id="phone-modal" role="dialog" style="display:none"><a href="tel:{phone}">{phone}</a></div>
+<script>
+window._cianConfig = window._cianConfig || {{}};
+window._cianConfig['frontend-offer-card'] = (window._cianConfig['frontend-offer-card'] || []).concat({json.dumps(state, ensure_ascii=False)});
+</script>
+</body></html>"""
+
+
+CAPTCHA_PAGE = """<html><head><title>Подтвердите, что вы не робот</title></head>
+<body><h1>Подтвердите, что вы не робот</h1><div class="captcha"></div></body></html>"""
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    server_version = "CianFixture/1.0"
+    stats = {"requests": 0, "failed": 0, "captcha": 0}
+    stats_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass  # не засоряем вывод обхода
+
+    def _send(self, status, body):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        with self.stats_lock:
+            self.stats["requests"] += 1
+        with _rng_lock:
+            delay = max(0.0, FIXTURE_LATENCY + _rng.uniform(-FIXTURE_JITTER, FIXTURE_JITTER))
+            roll = _rng.random()
+        time.sleep(delay)
+
+        parsed = urlparse(self.path)
+        parts = [p for p in parsed.path.split("/") if p]
+        if parsed.path == "/favicon.ico":
+            return self._send(404, "")
+        if roll < FIXTURE_FAIL_RATE:
+            with self.stats_lock:
+                self.stats["failed"] += 1
+            return self._send(503, "<html><body>Service Unavailable</body></html>")
+        if roll < FIXTURE_FAIL_RATE + FIXTURE_CAPTCHA_RATE:
+            with self.stats_lock:
+                self.stats["captcha"] += 1
+            return self._send(200, CAPTCHA_PAGE)
+
+        if parsed.path == "/cat.php":
+            query = parse_qs(parsed.query)
+            page = int((query.get("p") or ["1"])[0])
+            region = (query.get("region") or ["0"])[0]
+            sale = (query.get("deal_type") or ["rent"])[0]
+            return self._send(200, render_search(region, sale, page))
+        if len(parts) == 3 and parts[0] in ("rent", "sale") and parts[1] == "commercial" and parts[2].isdigit():
+            return self._send(200, render_detail(int(parts[2]), parts[0]))
+        return self._send(404, "<html><body>Not found</body></html>")
+
+
+def start_server(host=FIXTURE_HOST, port=FIXTURE_PORT):
+    """Запускает сервер в фоновом потоке. Возвращает (сервер, базовый адрес)."""
+    server = ThreadingHTTPServer((host, port), FixtureHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="cian-fixture", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    server, base_url = start_server()
+    print(f"✓ Заглушка ЦИАН запущена: {base_url} (страниц выдачи: {FIXTURE_PAGES}, объявлений на странице: {FIXTURE_PER_PAGE})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
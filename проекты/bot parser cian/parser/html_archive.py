@@ -0,0 +1,114 @@
+"""
+Архив сырого HTML страниц ЦИАН (SQLite).
+
+При RECORD_HTML = True обход складывает сюда HTML страниц выдачи и объявлений
+в сжатом виде (zstd, если установлен `zstandard`, иначе gzip). По архиву
+`replay.py` заново прогоняет извлечение полей без сети.
+"""
+import os
+import gzip
+import sqlite3
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:  # zstandard необязателен: без него пишем gzip
+    zstandard = None
+
+ARCHIVE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "html_archive.sqlite3")
+
+ZSTD_LEVEL = 6
+GZIP_LEVEL = 6
+
+
+def get_connection():
+    conn = sqlite3.connect(ARCHIVE_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    return conn
+
+
+def init_archive():
+    """Создаёт таблицу архива."""
+    conn = get_connection()
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS pages (
+        url TEXT PRIMARY KEY,
+        kind TEXT,  -- search / detail
+        job TEXT,
+        codec TEXT,  -- zstd / gzip
+        html BLOB,
+        size INTEGER,  -- размер без сжатия, байт
+        fetched_at TIMESTAMP
+    );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_kind_job ON pages (kind, job);")
+    conn.commit()
+    conn.close()
+
+
+def compress(html):
+    """Сжимает HTML. Возвращает (кодек, байты)."""
+    data = html.encode("utf-8")
+    if zstandard:
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return "gzip", gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def decompress(codec, blob):
+    if codec == "zstd":
+        if not zstandard:
+            raise RuntimeError("страница сжата zstd, а пакет zstandard не установлен")
+        return zstandard.ZstdDecompressor().decompress(blob).decode("utf-8")
+    return gzip.decompress(blob).decode("utf-8")
+
+
+def save_page(url, kind, html, job=None):
+    """Сохраняет (или перезаписывает) HTML страницы."""
+    if not html:
+        return
+    codec, blob = compress(html)
+    conn = get_connection()
+    with conn:
+        conn.execute("""
+        INSERT INTO pages (url, kind, job, codec, html, size, fetched_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(url) DO UPDATE SET
+            kind = excluded.kind,
+            job = excluded.job,
+            codec = excluded.codec,
+            html = excluded.html,
+            size = excluded.size,
+            fetched_at = excluded.fetched_at
+        """, (url, kind, job, codec, blob, len(html), datetime.now()))
+    conn.close()
+
+
+def iter_pages(kind=None, job=None):
+    """Перебирает (url, kind, job, html) из архива, по желанию с фильтром."""
+    sql = "SELECT url, kind, job, codec, html FROM pages WHERE 1 = 1"
+    params = []
+    if kind:
+        sql += " AND kind = ?"
+        params.append(kind)
+    if job:
+        sql += " AND job = ?"
+        params.append(job)
+    sql += " ORDER BY fetched_at, url"
+    conn = get_connection()
+    try:
+        for row in conn.execute(sql, params):
+            yield row["url"], row["kind"], row["job"], decompress(row["codec"], row["html"])
+    finally:
+        conn.close()
+
+
+def archive_stats():
+    """Возвращает {kind: (страниц, байт без сжатия, байт в архиве)}."""
+    conn = get_connection()
+    rows = conn.execute(
+        "SELECT kind, COUNT(*) AS n, SUM(size) AS raw, SUM(LENGTH(html)) AS packed FROM pages GROUP BY kind"
+    ).fetchall()
+    conn.close()
+    return {row["kind"]: (row["n"], row["raw"] or 0, row["packed"] or 0) for row in rows}
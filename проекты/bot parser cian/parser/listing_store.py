@@ -0,0 +1,394 @@
+"""
+Хранилище объявлений ЦИАН (SQLite).
+
+Заменяет дозапись в CSV: одна транзакция на пачку, upsert по id объявления ЦИАН,
+индексы для проверки «уже есть». CSV остаётся как выгрузка для бота.
+"""
+import os
+import re
+import csv
+import sqlite3
+import glob
+from datetime import datetime
+
+import addresses
+import dedup
+
+STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "listings.sqlite3")
+
+# Колонки CSV ↔ колонки таблицы
+CSV_TO_DB = {
+    "Ссылка": "url",
+    "Адрес": "address",
+    "Цена": "price",
+    "Тип помещения": "property_type",
+    "Площадь": "area",
+    "Этаж": "floor",
+    "Этажей в доме": "floors_total",
+    "Телефон": "phone",
+    "Регион": "region",
+    "Город": "locality",
+    "Район": "district",
+    "Улица": "street",
+    "Дом": "house",
+}
+DB_FIELDS = list(CSV_TO_DB.values())
+
+# Колонки отпечатка для склейки дублей (dedup.py); заполняются при записи
+DEDUP_FIELDS = {"addr_key": "TEXT", "area_bucket": "INTEGER", "price_band": "INTEGER", "cluster_id": "INTEGER"}
+# Поля, из которых считается отпечаток: при их изменении объявление заново ищет свой кластер
+FINGERPRINT_SOURCE = ["locality", "street", "house", "area", "price", "floor"]
+
+
+def get_connection():
+    conn = sqlite3.connect(STORE_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    return conn
+
+
+def init_store():
+    """Создаёт таблицу объявлений и индексы."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS listings (
+        offer_id INTEGER PRIMARY KEY,
+        city TEXT,
+        deal_type TEXT,
+        url TEXT UNIQUE,
+        address TEXT,
+        price NUMERIC,  -- число или диапазон строкой "от - до"
+        property_type TEXT,
+        area REAL,
+        floor INTEGER,
+        floors_total INTEGER,
+        phone TEXT,
+        region TEXT,  -- части адреса (addresses.split_address)
+        locality TEXT,
+        district TEXT,
+        street TEXT,
+        house TEXT,
+        addr_key TEXT,  -- отпечаток для склейки дублей (dedup.fingerprint)
+        area_bucket INTEGER,
+        price_band INTEGER,
+        cluster_id INTEGER,  -- id первого объявления того же помещения
+        active INTEGER DEFAULT 1,
+        first_seen TIMESTAMP,
+        last_seen TIMESTAMP,
+        updated_at TIMESTAMP
+    );
+    """)
+    _add_missing_columns(cur)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_listings_city_deal ON listings (city, deal_type, active);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_listings_district ON listings (city, deal_type, district);")
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_listings_fingerprint ON listings (city, deal_type, addr_key, floor, area_bucket);"
+    )
+    rows = cur.execute(
+        "SELECT offer_id FROM listings WHERE cluster_id IS NULL ORDER BY first_seen, offer_id"
+    ).fetchall()
+    if rows:
+        clustered = _assign_clusters(cur, [row[0] for row in rows])
+        print(f"✓ Хранилище: отпечатки посчитаны для {len(rows)} объявлений, в дублях: {clustered}")
+    conn.commit()
+    conn.close()
+
+
+def _add_missing_columns(cur):
+    """Добавляет новые колонки в старую таблицу; части адреса разбирает из сохранённых адресов."""
+    existing = {row[1] for row in cur.execute("PRAGMA table_info(listings)")}
+    for field, sql_type in DEDUP_FIELDS.items():
+        if field not in existing:
+            cur.execute(f"ALTER TABLE listings ADD COLUMN {field} {sql_type}")
+    missing = [CSV_TO_DB[col] for col in addresses.ADDRESS_COLUMNS if CSV_TO_DB[col] not in existing]
+    if not missing:
+        return
+    for field in missing:
+        cur.execute(f"ALTER TABLE listings ADD COLUMN {field} TEXT")
+    rows = cur.execute("SELECT offer_id, address FROM listings").fetchall()
+    cur.executemany(
+        "UPDATE listings SET region = ?, locality = ?, district = ?, street = ?, house = ? WHERE offer_id = ?",
+        [
+            [parts[col] or None for col in addresses.ADDRESS_COLUMNS] + [offer_id]
+            for offer_id, parts in ((row[0], addresses.split_address(row[1])) for row in rows)
+        ],
+    )
+    print(f"✓ Хранилище: добавлены колонки {', '.join(missing)}, разобрано адресов: {len(rows)}")
+
+
+def _assign_clusters(cur, offer_ids):
+    """Считает отпечатки объявлений без кластера и относит их к кластеру уже сохранённого дубля.
+
+    Кандидаты ищутся по индексу (город, сделка, адрес, этаж, соседние корзины площади)
+    с соседней ценовой полосой и сравниваются только с каноническим объявлением
+    кластера (cluster_id = offer_id), а не с любым его членом — иначе кластер
+    разрастался бы цепочкой A~B, B~C. Без дубля объявление открывает свой кластер.
+    Возвращает число объявлений, попавших в чужой кластер.
+    """
+    clustered = 0
+    for offer_id in offer_ids:
+        row = cur.execute(
+            "SELECT city, deal_type, locality, street, house, area, price, floor FROM listings "
+            "WHERE offer_id = ? AND cluster_id IS NULL",
+            (offer_id,),
+        ).fetchone()
+        if row is None:
+            continue
+        city, deal_type, locality, street, house, area, price, floor = row
+        key, bucket, band = dedup.fingerprint(locality, street, house, area, price)
+        cluster_id = offer_id
+        if key and bucket is not None and band is not None:
+            match = cur.execute("""
+            SELECT offer_id FROM listings
+            WHERE city = ? AND deal_type = ? AND addr_key = ? AND floor IS ?
+              AND area_bucket BETWEEN ? AND ? AND price_band BETWEEN ? AND ?
+              AND cluster_id = offer_id AND offer_id != ?
+            ORDER BY first_seen, offer_id LIMIT 1
+            """, (city, deal_type, key, floor, bucket - 1, bucket + 1, band - 1, band + 1, offer_id)).fetchone()
+            if match:
+                cluster_id = match[0]
+                clustered += 1
+        cur.execute(
+            "UPDATE listings SET addr_key = ?, area_bucket = ?, price_band = ?, cluster_id = ? WHERE offer_id = ?",
+            (key, bucket, band, cluster_id, offer_id),
+        )
+    return clustered
+
+
+def _select_by_ids(cur, sql, offer_ids, chunk=500):
+    """Выполняет sql с условием "offer_id IN (...)" по частям (лимит параметров SQLite)."""
+    rows = []
+    offer_ids = list(offer_ids)
+    for i in range(0, len(offer_ids), chunk):
+        part = offer_ids[i:i + chunk]
+        rows += cur.execute(sql.format(ids=", ".join("?" * len(part))), part).fetchall()
+    return rows
+
+
+def _fingerprint_sources(cur, offer_ids):
+    """{offer_id: значения FINGERPRINT_SOURCE} — снимок до записи, чтобы увидеть изменения."""
+    rows = _select_by_ids(
+        cur, f"SELECT offer_id, {', '.join(FINGERPRINT_SOURCE)} FROM listings WHERE offer_id IN ({{ids}})", offer_ids
+    )
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+
+def _recluster(cur, offer_ids, before):
+    """Обновляет кластеры записанных объявлений.
+
+    before — снимок _fingerprint_sources до записи. У объявлений, чьи адрес, площадь,
+    цена или этаж изменились, отпечаток и кластер сбрасываются; если это было
+    каноническое объявление кластера, заново распределяются и остальные его члены.
+    Затем все объявления без кластера проходят _assign_clusters (раньше виденные — первыми).
+    """
+    after = _fingerprint_sources(cur, offer_ids)
+    changed = [offer_id for offer_id, values in before.items() if after.get(offer_id, values) != values]
+    released = set(offer_ids)
+    for offer_id in changed:
+        is_canonical = cur.execute(
+            "SELECT 1 FROM listings WHERE offer_id = ? AND cluster_id = offer_id", (offer_id,)
+        ).fetchone()
+        if is_canonical:
+            released.update(row[0] for row in cur.execute("SELECT offer_id FROM listings WHERE cluster_id = ?", (offer_id,)))
+            cur.execute("UPDATE listings SET cluster_id = NULL WHERE cluster_id = ?", (offer_id,))
+        cur.execute(
+            "UPDATE listings SET addr_key = NULL, area_bucket = NULL, price_band = NULL, cluster_id = NULL "
+            "WHERE offer_id = ?",
+            (offer_id,),
+        )
+    pending = _select_by_ids(
+        cur, "SELECT offer_id, first_seen FROM listings WHERE cluster_id IS NULL AND offer_id IN ({ids})", released
+    )
+    pending.sort(key=lambda row: (str(row[1] or ""), row[0]))
+    return _assign_clusters(cur, [row[0] for row in pending])
+
+
+def offer_id_from_url(url):
+    """Числовой id объявления ЦИАН из ссылки (или None)."""
+    m = re.search(r"/commercial/(\d+)", url or "")
+    return int(m.group(1)) if m else None
+
+
+def _clean(value):
+    """NaN/пустые строки → None."""
+    if value is None:
+        return None
+    if isinstance(value, float) and value != value:
+        return None
+    if isinstance(value, str) and not value.strip():
+        return None
+    return value
+
+
+def upsert_rows(rows, city, deal_type):
+    """Записывает пачку строк (в формате CSV-колонок) одной транзакцией.
+
+    Пустые значения не затирают уже сохранённые (например, телефон).
+    Возвращает число записанных строк.
+    """
+    now = datetime.now()
+    params = []
+    for row in rows:
+        offer_id = offer_id_from_url(row.get("Ссылка"))
+        if not offer_id:
+            continue
+        row = addresses.add_address_columns(dict(row))
+        values = [_clean(row.get(col)) for col in CSV_TO_DB]
+        params.append([offer_id, city, deal_type] + values + [now, now, now])
+    if not params:
+        return 0
+
+    updates = ",\n        ".join(
+        f"{field} = COALESCE(excluded.{field}, listings.{field})" for field in DB_FIELDS
+    )
+    conn = get_connection()
+    with conn:
+        cur = conn.cursor()
+        before = _fingerprint_sources(cur, [p[0] for p in params])
+        cur.executemany(f"""
+        INSERT INTO listings (offer_id, city, deal_type, {", ".join(DB_FIELDS)}, first_seen, last_seen, updated_at)
+        VALUES ({", ".join("?" * (len(DB_FIELDS) + 6))})
+        ON CONFLICT(offer_id) DO UPDATE SET
+        {updates},
+        active = 1,
+        last_seen = excluded.last_seen,
+        updated_at = excluded.updated_at
+        """, params)
+        _recluster(cur, [p[0] for p in params], before)
+    conn.close()
+    return len(params)
+
+
+def count_listings(city, deal_type):
+    conn = get_connection()
+    row = conn.execute(
+        "SELECT COUNT(*) AS n FROM listings WHERE city = ? AND deal_type = ?", (city, deal_type)
+    ).fetchone()
+    conn.close()
+    return row["n"]
+
+
+def existing_links(city, deal_type):
+    """Ссылки уже сохранённых объявлений (по индексу, без чтения файлов)."""
+    conn = get_connection()
+    rows = conn.execute(
+        "SELECT url FROM listings WHERE city = ? AND deal_type = ?", (city, deal_type)
+    ).fetchall()
+    conn.close()
+    return {row["url"] for row in rows}
+
+
+def has_listing(url):
+    """Есть ли объявление в хранилище (поиск по первичному ключу)."""
+    offer_id = offer_id_from_url(url)
+    if not offer_id:
+        return False
+    conn = get_connection()
+    row = conn.execute("SELECT 1 FROM listings WHERE offer_id = ?", (offer_id,)).fetchone()
+    conn.close()
+    return row is not None
+
+
+def get_prices(city, deal_type, active_only=True):
+    """Возвращает {url: цена} для города и типа сделки."""
+    sql = "SELECT url, price FROM listings WHERE city = ? AND deal_type = ?"
+    if active_only:
+        sql += " AND active = 1"
+    conn = get_connection()
+    rows = conn.execute(sql, (city, deal_type)).fetchall()
+    conn.close()
+    return {row["url"]: row["price"] for row in rows}
+
+
+def update_listing(url, price=None, active=None):
+    """Обновляет цену и/или статус объявления."""
+    offer_id = offer_id_from_url(url)
+    if not offer_id:
+        return
+    conn = get_connection()
+    with conn:
+        if price is not None:
+            cur = conn.cursor()
+            before = _fingerprint_sources(cur, [offer_id])
+            cur.execute(
+                "UPDATE listings SET price = ?, updated_at = ? WHERE offer_id = ?",
+                (price, datetime.now(), offer_id),
+            )
+            _recluster(cur, [offer_id], before)
+        if active is not None:
+            conn.execute(
+                "UPDATE listings SET active = ?, updated_at = ? WHERE offer_id = ?",
+                (int(active), datetime.now(), offer_id),
+            )
+    conn.close()
+
+
+def import_csv(path, city, deal_type):
+    """Разовый импорт существующего CSV в хранилище."""
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r", encoding="utf-8-sig") as f:
+        rows = list(csv.DictReader(f))
+    imported = upsert_rows(rows, city, deal_type)
+    print(f"✓ Импортировано из {os.path.basename(path)}: {imported}")
+    return imported
+
+
+def import_all_csvs(parser_dir=None):
+    """Импортирует все файлы вида <город>_cian_<сделка>.csv из папки парсера."""
+    parser_dir = parser_dir or os.path.dirname(os.path.abspath(__file__))
+    init_store()
+    total = 0
+    for path in sorted(glob.glob(os.path.join(parser_dir, "*_cian_*.csv"))):
+        m = re.match(r"(.+)_cian_(rent|sale)\.csv$", os.path.basename(path))
+        if m:
+            total += import_csv(path, m.group(1), m.group(2))
+    return total
+
+
+def export_csv(path, city, deal_type, columns=None):
+    """Полностью перезаписывает CSV активными объявлениями города (атомарно).
+
+    Из каждого кластера дублей выгружается одно объявление — самое раннее активное.
+    """
+    columns = columns or list(CSV_TO_DB)
+    conn = get_connection()
+    rows = conn.execute("""
+    SELECT * FROM (
+        SELECT *, ROW_NUMBER() OVER (
+            PARTITION BY COALESCE(cluster_id, offer_id) ORDER BY first_seen, offer_id
+        ) AS copy_no
+        FROM listings WHERE city = ? AND deal_type = ? AND active = 1
+    ) WHERE copy_no = 1
+    ORDER BY first_seen, offer_id
+    """, (city, deal_type)).fetchall()
+    total = conn.execute(
+        "SELECT COUNT(*) FROM listings WHERE city = ? AND deal_type = ? AND active = 1", (city, deal_type)
+    ).fetchone()[0]
+    conn.close()
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([_format_cell(row[CSV_TO_DB[col]]) if col in CSV_TO_DB else "" for col in columns])
+    os.replace(tmp_path, path)
+    duplicates = f" (скрыто дублей: {total - len(rows)})" if total > len(rows) else ""
+    print(f"✓ Выгружено в CSV {len(rows)} объявлений{duplicates}: {path}")
+    return len(rows)
+
+
+def _format_cell(value):
+    """Убирает .0 у целых float, None → пустая строка."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+if __name__ == "__main__":
+    import_all_csvs()
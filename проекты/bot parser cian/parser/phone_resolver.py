@@ -0,0 +1,185 @@
+"""
+Отложенное получение телефонов ЦИАН.
+
+Основной обход можно запускать с PHONE_MODE = "deferred" (без кнопки телефона).
+Этот скрипт берёт только объявления, которые кто-то из пользователей бота
+добавил в избранное, прогоняет их через очередь браузеров и кладёт номера
+в кэш `phone_cache.sqlite3`, откуда их читает `tgbot/parser.py`.
+"""
+import os
+import json
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import cian
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PHONE_CACHE_PATH = os.path.join(BASE_DIR, "phone_cache.sqlite3")
+BOT_DB_PATH = os.path.join(os.path.dirname(BASE_DIR), "tgbot", "bot_data.db")
+
+PHONE_WORKERS = 2
+MAX_ATTEMPTS = 3
+WATCH_INTERVAL = 0  # секунд между проходами; 0 — один проход и выход
+
+
+def get_connection():
+    conn = sqlite3.connect(PHONE_CACHE_PATH)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_cache():
+    """Создаёт таблицу кэша телефонов."""
+    conn = get_connection()
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS phones (
+        url TEXT PRIMARY KEY,
+        phone TEXT,
+        attempts INTEGER DEFAULT 0,
+        updated_at TIMESTAMP
+    );
+    """)
+    conn.commit()
+    conn.close()
+
+
+def get_cached_phones():
+    """Возвращает {url: phone} для всех найденных номеров."""
+    if not os.path.exists(PHONE_CACHE_PATH):
+        return {}
+    conn = get_connection()
+    rows = conn.execute("SELECT url, phone FROM phones WHERE phone IS NOT NULL").fetchall()
+    conn.close()
+    return {row["url"]: row["phone"] for row in rows}
+
+
+def save_phone(url, phone):
+    """Записывает результат (номер или неудачную попытку) в кэш."""
+    conn = get_connection()
+    conn.execute("""
+    INSERT INTO phones (url, phone, attempts, updated_at)
+    VALUES (?, ?, 1, ?)
+    ON CONFLICT(url) DO UPDATE SET
+        phone = COALESCE(excluded.phone, phones.phone),
+        attempts = phones.attempts + 1,
+        updated_at = excluded.updated_at
+    """, (url, phone, datetime.now()))
+    conn.commit()
+    conn.close()
+
+
+def favorite_links():
+    """Ссылки CIAN из избранного пользователей бота, у которых нет телефона."""
+    if not os.path.exists(BOT_DB_PATH):
+        print(f"⚠ База бота не найдена: {BOT_DB_PATH}")
+        return []
+
+    conn = sqlite3.connect(BOT_DB_PATH)
+    try:
+        rows = conn.execute("SELECT listing_data FROM favorites").fetchall()
+    except sqlite3.Error as e:
+        print(f"⚠ Не удалось прочитать избранное: {e}")
+        rows = []
+    conn.close()
+
+    links = []
+    seen = set()
+    for (listing_data,) in rows:
+        try:
+            listing = json.loads(listing_data)
+        except (TypeError, ValueError):
+            continue
+        link = listing.get("link") or ""
+        phone = cian.validate_phone_number(listing.get("phone"))
+        if "cian.ru" in link and not phone and link not in seen:
+            seen.add(link)
+            links.append(link)
+    return links
+
+
+def pending_links():
+    """Избранные ссылки без телефона в кэше и с неисчерпанными попытками."""
+    links = favorite_links()
+    if not links:
+        return []
+    conn = get_connection()
+    known = {
+        row["url"]: row
+        for row in conn.execute("SELECT url, phone, attempts FROM phones").fetchall()
+    }
+    conn.close()
+    return [
+        url for url in links
+        if url not in known or (known[url]["phone"] is None and known[url]["attempts"] < MAX_ATTEMPTS)
+    ]
+
+
+def _phone_worker(worker_id, tasks, results):
+    """Воркер: свой браузер, берёт ссылки из очереди и жмёт кнопку телефона."""
+    driver = None
+    try:
+        driver = cian.get_driver()
+        while True:
+            try:
+                url = tasks.get_nowait()
+            except queue.Empty:
+                break
+            print(f"\n[телефон #{worker_id}] {url}")
+            phone = cian.fetch_phone_with_browser(driver, url)
+            save_phone(url, phone)
+            results.put((url, phone))
+    except Exception as e:
+        print(f" ✗ Воркер телефонов {worker_id}: {e}")
+    finally:
+        if driver:
+            driver.quit()
+
+
+def resolve_pending(workers=PHONE_WORKERS):
+    """Один проход: получает телефоны для всех ожидающих избранных объявлений."""
+    init_cache()
+    links = pending_links()
+    print(f"\nОжидают телефона: {len(links)}")
+    if not links:
+        return 0
+
+    tasks = queue.Queue()
+    for url in links:
+        tasks.put(url)
+    results = queue.Queue()
+
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=_phone_worker, args=(i, tasks, results), daemon=True)
+        for i in range(1, max(1, min(workers, len(links))) + 1)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    found = 0
+    while not results.empty():
+        _, phone = results.get()
+        if phone:
+            found += 1
+    print(f"\n✓ Телефонов найдено: {found} из {len(links)} за {time.perf_counter() - started:.1f} с")
+    return found
+
+
+def main():
+    try:
+        while True:
+            resolve_pending()
+            if not WATCH_INTERVAL:
+                break
+            time.sleep(WATCH_INTERVAL)
+    except KeyboardInterrupt:
+        print("\n⚠ Остановлено пользователем")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Обновление уже сохранённых объявлений ЦИАН.
+
+За один запуск перепроверяется не больше REFRESH_BUDGET страниц. Сначала —
+объявления из избранного пользователей бота, затем остальные, начиная с тех,
+что дольше всего не проверялись. Изменения цены и статуса пишутся в историю
+(`price_history` в журнале обхода), снятые объявления помечаются неактивными
+и перестают попадать в выдачу бота.
+"""
+import os
+import json
+import sqlite3
+
+import pandas as pd
+
+import cian
+import cian_http
+import crawl_journal
+import listing_store
+import throttle
+
+REFRESH_BUDGET = 100  # страниц за запуск
+
+BOT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tgbot", "bot_data.db")
+
+
+def favorite_urls():
+    """Ссылки из избранного пользователей бота."""
+    if not os.path.exists(BOT_DB_PATH):
+        return set()
+    try:
+        conn = sqlite3.connect(BOT_DB_PATH)
+        rows = conn.execute("SELECT listing_data FROM favorites").fetchall()
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"⚠ Не удалось прочитать избранное: {e}")
+        return set()
+
+    urls = set()
+    for (listing_data,) in rows:
+        try:
+            link = json.loads(listing_data).get("link")
+        except (TypeError, ValueError, AttributeError):
+            continue
+        if link:
+            urls.add(link)
+    return urls
+
+
+def plan_refresh(rows, states, favorites, budget=REFRESH_BUDGET):
+    """Выбирает ссылки для проверки: избранное, затем самые давно проверенные."""
+    candidates = []
+    for url in rows:
+        state = states.get(url) or {}
+        if state and not state.get("active", 1):
+            continue  # снятые не перепроверяем
+        candidates.append((url not in favorites, state.get("last_checked") or 0, url))
+    candidates.sort()
+    return [url for _, _, url in candidates[:budget]]
+
+
+def check_listing(url):
+    """Проверяет объявление. Возвращает (активно, цена) или None, если результат неясен."""
+    status, html = cian_http.fetch_page(url)
+    if status in (404, 410):
+        return False, None
+    if status != 200 or not html:
+        return None
+    if cian_http.is_offer_removed(html):
+        return False, None
+    fields = cian_http.extract_detail_fields(html)
+    price = cian.extract_price(fields.get("price")) if fields else None
+    if price is None:
+        return None  # капча или сломанная страница — не делаем выводов
+    return True, price
+
+
+def previous_price(state, price):
+    """Последняя известная цена строкой (из журнала или таблицы) или None, если её нет."""
+    if state.get("price"):
+        return state["price"]
+    if price is None or pd.isna(price) or not str(price).strip():
+        return None
+    return str(cian.format_number(price))
+
+
+def refresh(job=None, budget=REFRESH_BUDGET):
+    """Один проход обновления по заданию (по умолчанию — из настроек cian.py; хранилище или CSV)."""
+    job = job or cian.make_job()
+    output_file = job["output_file"]
+    use_store = cian.STORAGE == "sqlite"
+
+    crawl_journal.init_journal()
+    if use_store:
+        listing_store.init_store()
+        prices = listing_store.get_prices(job["city"], job["sale"])
+    elif os.path.exists(output_file):
+        df = pd.read_csv(output_file, encoding="utf-8-sig")
+        prices = {str(link): price for link, price in zip(df["Ссылка"], df["Цена"]) if isinstance(link, str)}
+    else:
+        print(f"⚠ Файл не найден: {output_file}")
+        return
+
+    states = crawl_journal.get_listing_states()
+    favorites = favorite_urls()
+    plan = plan_refresh(prices, states, favorites, budget)
+    print(f"\nК проверке: {len(plan)} из {len(prices)} (в избранном: {len(favorites & set(plan))})")
+
+    changed_prices = {}
+    stats = {"checked": 0, "price": 0, "inactive": 0, "unknown": 0}
+    for idx, url in enumerate(plan, 1):
+        print(f"[{idx}/{len(plan)}] {url}")
+        result = check_listing(url)
+        if result is None:
+            stats["unknown"] += 1
+            print(" ⚠ Не удалось проверить")
+            continue
+
+        active, new_price = result
+        state = states.get(url) or {}
+        old_price = previous_price(state, prices.get(url))
+        old_active = state.get("active", 1)
+        new_price_str = str(new_price) if new_price is not None else old_price
+
+        crawl_journal.record_check(url, old_price, new_price_str, old_active, active)
+        if use_store:
+            listing_store.update_listing(url, price=new_price, active=active)
+        stats["checked"] += 1
+        if not active:
+            stats["inactive"] += 1
+            print(" ✗ Снято с публикации")
+        elif old_price is not None and new_price_str != old_price:
+            stats["price"] += 1
+            changed_prices[url] = new_price
+            print(f" ✓ Цена изменилась: {old_price} → {new_price_str}")
+
+    if use_store:
+        cian.export_output_csv(job)
+    elif changed_prices:
+        df["Цена"] = [
+            changed_prices.get(link, price) for link, price in zip(df["Ссылка"], df["Цена"])
+        ]
+        df.to_csv(output_file, index=False, encoding="utf-8-sig")
+        print(f"\n✓ Обновлены цены в файле {output_file}")
+
+    print(
+        f"\n✓ Проверено: {stats['checked']}, изменилась цена: {stats['price']}, "
+        f"снято: {stats['inactive']}, не удалось проверить: {stats['unknown']}"
+    )
+    throttle.print_summary()
+
+
+if __name__ == "__main__":
+    refresh()
@@ -0,0 +1,115 @@
+"""
+Повторный прогон извлечения полей по архиву HTML (без сети).
+
+Архив пишет основной обход при RECORD_HTML = True (см. html_archive.py).
+Скрипт разбирает каждую сохранённую страницу теми же функциями, что и обход
+(`cian_http.extract_detail_fields` → `cian.normalize_page_fields`), печатает,
+сколько полей удалось заполнить, и скорость разбора в страницах в секунду.
+При REPLAY_WRITE = True строки записываются в хранилище и CSV выгружаются
+заново — так исправления разборщиков применяются без повторного обхода.
+"""
+import os
+import re
+import sys
+import time
+
+import cian
+import cian_http
+import html_archive
+import listing_store
+
+REPLAY_JOB = None  # например "chelyabinsk_rent"; None — весь архив
+REPLAY_WRITE = False  # записать строки в хранилище и перевыгрузить CSV
+REPLAY_MIN_RATE = 0  # стр/с; если разбор медленнее — код выхода 1 (проверка на регрессию)
+
+_SEARCH_LINK_RE = re.compile(r"/(rent|sale)/commercial/(\d+)")
+
+
+def search_links(html):
+    """Ссылки на объявления со страницы выдачи (как их собирает collect_cian_links)."""
+    return {
+        f"{cian.BASE_URL}/{deal}/commercial/{offer_id}/"
+        for deal, offer_id in _SEARCH_LINK_RE.findall(html or "")
+    }
+
+
+def parse_detail(url, html):
+    """Строка таблицы из сохранённой детальной страницы (или None)."""
+    fields = cian_http.extract_detail_fields(html)
+    return cian.normalize_page_fields(url, fields) if fields else None
+
+
+def split_job(job):
+    """'город_сделка' → (город, сделка)."""
+    city, _, deal = (job or "").rpartition("_")
+    return city, deal
+
+
+def replay(job=REPLAY_JOB, write=REPLAY_WRITE):
+    """Прогоняет архив через разборщики. Возвращает скорость разбора (стр/с)."""
+    if not os.path.exists(html_archive.ARCHIVE_PATH):
+        print(f"⚠ Архив не найден: {html_archive.ARCHIVE_PATH} (включите RECORD_HTML в cian.py)")
+        return 0.0
+
+    stats = {"search": 0, "links": 0, "detail": 0, "rows": 0, "no_price": 0, "no_address": 0, "no_area": 0}
+    rows_by_job = {}
+    parse_seconds = 0.0
+    started = time.perf_counter()
+
+    for url, kind, page_job, html in html_archive.iter_pages(job=job):
+        t0 = time.perf_counter()
+        if kind == "search":
+            links = search_links(html)
+            parse_seconds += time.perf_counter() - t0
+            stats["search"] += 1
+            stats["links"] += len(links)
+            continue
+
+        try:
+            row = parse_detail(url, html)
+        except Exception as e:
+            row = None
+            print(f" ✗ {url}: {e}")
+        parse_seconds += time.perf_counter() - t0
+        stats["detail"] += 1
+        if not row:
+            continue
+        stats["rows"] += 1
+        stats["no_price"] += row["Цена"] is None
+        stats["no_address"] += not row["Адрес"]
+        stats["no_area"] += row["Площадь"] is None
+        if write:
+            rows_by_job.setdefault(page_job, []).append(row)
+
+    wall = time.perf_counter() - started
+    pages = stats["search"] + stats["detail"]
+    rate = pages / parse_seconds if parse_seconds > 0 else 0.0
+
+    print(f"\nСтраниц выдачи: {stats['search']} (ссылок: {stats['links']})")
+    print(
+        f"Объявлений: {stats['detail']}, разобрано: {stats['rows']} "
+        f"(без цены: {stats['no_price']}, без адреса: {stats['no_address']}, без площади: {stats['no_area']})"
+    )
+    print(f"Разбор: {pages} стр. за {parse_seconds:.2f} с ({rate:.1f} стр/с), всего с распаковкой {wall:.2f} с")
+    for kind, (n, raw, packed) in sorted(html_archive.archive_stats().items()):
+        ratio = raw / packed if packed else 0.0
+        print(f" Архив {kind}: {n} стр., {raw / 1024 / 1024:.1f} МБ → {packed / 1024 / 1024:.1f} МБ (×{ratio:.1f})")
+
+    if write:
+        listing_store.init_store()
+        for page_job, rows in rows_by_job.items():
+            city, deal = split_job(page_job)
+            if not city:
+                continue
+            for i in range(0, len(rows), cian.BATCH_SIZE):
+                listing_store.upsert_rows(rows[i:i + cian.BATCH_SIZE], city, deal)
+            listing_store.export_csv(cian.output_path(city, deal), city, deal, cian.COLUMNS)
+
+    return rate
+
+
+if __name__ == "__main__":
+    rate = replay()
+    if REPLAY_MIN_RATE and rate < REPLAY_MIN_RATE:
+        print(f"✗ Разбор медленнее порога: {rate:.1f} < {REPLAY_MIN_RATE} стр/с")
+        sys.exit(1)
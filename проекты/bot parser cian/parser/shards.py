@@ -0,0 +1,94 @@
+"""
+Планировщик шардов поиска ЦИАН.
+
+Выдача cat.php обрезается после SEARCH_PAGE_CAP страниц, поэтому большой регион
+разбивается на шарды по типу помещения, цене и площади. Шард, который упёрся
+в лимит страниц, делится пополам, пока не станет «ненасыщенным».
+Диапазоны цены и площади полуоткрытые [от, до): объявление ровно на границе
+попадает только в один шард.
+"""
+
+SEARCH_PAGE_CAP = 54  # столько страниц ЦИАН отдаёт по одному запросу
+
+# office_type[0]: 1 — офис, 2 — торговая площадь, 3 — склад, 4 — ПСН, 5 — общепит.
+# Парсер собирает только офисы (тот же office_type, что в build_search_page_url),
+# поэтому по типу шард один; другие типы добавляются в этот список.
+OFFICE_TYPES = ["1"]
+
+# Границы ценовых полос (руб); None — без верхней границы
+PRICE_BANDS = {
+    "rent": [0, 30_000, 60_000, 100_000, 150_000, 250_000, 500_000, 1_000_000, None],
+    "sale": [0, 3_000_000, 6_000_000, 10_000_000, 20_000_000, 50_000_000, 100_000_000, None],
+}
+
+MIN_PRICE_STEP = {"rent": 1_000, "sale": 100_000}
+MIN_AREA_STEP = 5
+AREA_EPSILON = 0.01  # верхняя граница площади исключается: maxarea = до − AREA_EPSILON (площадь дробная)
+MAX_AREA = 10_000
+
+
+def plan_shards(sale):
+    """Начальный план: типы помещений × ценовые полосы."""
+    bands = PRICE_BANDS.get(sale) or PRICE_BANDS["rent"]
+    shards = []
+    for office_type in OFFICE_TYPES:
+        for lo, hi in zip(bands, bands[1:]):
+            shards.append({
+                "office_type": office_type,
+                "price": (lo, hi),
+                "area": (0, None),
+            })
+    return shards
+
+
+def _split_range(lo, hi, min_step, open_top):
+    """Делит [lo, hi) пополам. Открытую сверху полосу делит на [lo, 2*lo) и [2*lo, None)."""
+    if hi is None:
+        mid = max(lo * 2, lo + open_top)
+        return [(lo, mid), (mid, None)]
+    if hi - lo < 2 * min_step:
+        return None
+    mid = (lo + hi) // 2
+    return [(lo, mid), (mid, hi)]
+
+
+def split_shard(shard, sale):
+    """Делит насыщенный шард: сначала по цене, потом по площади. None — делить некуда."""
+    lo, hi = shard["price"]
+    price_step = MIN_PRICE_STEP.get(sale, 1_000)
+    halves = _split_range(lo, hi, price_step, open_top=price_step * 100)
+    if halves:
+        return [dict(shard, price=half) for half in halves]
+
+    a_lo, a_hi = shard["area"]
+    if a_hi is None and a_lo >= MAX_AREA:
+        return None
+    halves = _split_range(a_lo, a_hi, MIN_AREA_STEP, open_top=50)
+    if halves:
+        return [dict(shard, area=half) for half in halves]
+    return None
+
+
+def shard_filters(shard):
+    """Параметры запроса cat.php для шарда."""
+    filters = {"office_type[0]": shard["office_type"]}
+    lo, hi = shard["price"]
+    if lo:
+        filters["minprice"] = str(lo)
+    if hi is not None:
+        filters["maxprice"] = str(hi - 1)  # цена в целых рублях
+    a_lo, a_hi = shard["area"]
+    if a_lo:
+        filters["minarea"] = str(a_lo)
+    if a_hi is not None:
+        filters["maxarea"] = str(round(a_hi - AREA_EPSILON, 2))
+    return filters
+
+
+def describe_shard(shard):
+    """Короткое описание шарда для логов."""
+    lo, hi = shard["price"]
+    a_lo, a_hi = shard["area"]
+    price = f"{lo}–{hi if hi is not None else '∞'} ₽"
+    area = f"{a_lo}–{a_hi if a_hi is not None else '∞'} м²"
+    return f"тип {shard['office_type']}, цена {price}, площадь {area}"
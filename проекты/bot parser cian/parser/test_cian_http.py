@@ -0,0 +1,108 @@
+"""
+Офлайн-проверка разбора детальной страницы по HTTP (cian_http.py) на сохранённых
+страницах из fixtures/ (данные обезличены).
+
+Запуск из папки parser: `python -m unittest test_cian_http`.
+"""
+import os
+import re
+import unittest
+
+import cian
+import cian_http
+import throttle
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+OFFER_URL = "https://ekb.cian.ru/rent/commercial/300000001/"
+OFFER_ADDRESS = "Свердловская область, Екатеринбург, р-н Ленинский, ул. Примерная, 10"
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def without_state(html):
+    """Страница без встроенного состояния — разбор только по разметке."""
+    return re.sub(r"<script>.*?</script>", "", html, flags=re.S)
+
+
+class ExtractDetailFieldsTest(unittest.TestCase):
+    def setUp(self):
+        self.html = read_fixture("cian_detail_offer.html")
+
+    def test_offer_state(self):
+        offer = cian_http.extract_offer_state(self.html)
+        self.assertEqual(offer["id"], 300000001)
+        self.assertEqual(offer["bargainTerms"]["priceRur"], 85000)
+
+    def test_fields_from_state(self):
+        fields = cian_http.extract_detail_fields(self.html)
+        self.assertEqual(fields["price"], "85000")
+        self.assertEqual(fields["address"], OFFER_ADDRESS)
+        self.assertEqual(fields["area"], "Площадь 45.3 м²")
+        self.assertEqual(fields["floor"], "Этаж 2 из 9")
+        self.assertEqual(fields["phone"], "+79990000000")
+
+    def test_fields_from_markup(self):
+        html = without_state(self.html)
+        self.assertIsNone(cian_http.extract_offer_state(html))
+        fields = cian_http.extract_detail_fields(html)
+        self.assertEqual(fields["price"], "85 000 ₽/мес.")
+        self.assertTrue(fields["address"].startswith(OFFER_ADDRESS))
+        self.assertEqual(fields["area"], "Площадь\n45,3 м²")
+        self.assertEqual(fields["floor"], "Этаж\n2 из 9")
+        self.assertEqual(fields["phone"], "+79990000000")
+
+    def test_normalized_row(self):
+        # Состояние и разметка дают одну и ту же строку таблицы
+        for html in (self.html, without_state(self.html)):
+            row = cian.normalize_page_fields(OFFER_URL, cian_http.extract_detail_fields(html))
+            self.assertEqual(row["Цена"], 85000)
+            self.assertEqual(row["Адрес"], OFFER_ADDRESS)
+            self.assertEqual(row["Площадь"], 45.3)
+            self.assertEqual(row["Этаж"], 2)
+            self.assertEqual(row["Этажей в доме"], 9)
+            self.assertEqual(row["Телефон"], "+79990000000")
+
+    def test_empty_page(self):
+        self.assertIsNone(cian_http.extract_detail_fields(""))
+
+
+class ChallengeCheckTest(unittest.TestCase):
+    def test_script_markers_are_not_a_challenge(self):
+        html = read_fixture("cian_detail_offer.html").replace(
+            "</body>", "<script>window.__recaptcha={};</script></body>"
+        )
+        self.assertEqual(throttle.classify(200, cian_http.visible_text(html)), throttle.OK)
+
+    def test_challenge_page(self):
+        html = (
+            "<html><head><title>Captcha - база объявлений ЦИАН</title></head>"
+            "<body><p>Подтвердите, что вы не робот</p></body></html>"
+        )
+        self.assertEqual(throttle.classify(200, cian_http.visible_text(html)), throttle.CHALLENGE)
+
+
+class OfferRemovedTest(unittest.TestCase):
+    def test_published_offer(self):
+        self.assertFalse(cian_http.is_offer_removed(read_fixture("cian_detail_offer.html")))
+
+    def test_similar_offer_marker_in_script(self):
+        html = read_fixture("cian_detail_offer.html").replace(
+            "</body>",
+            '<script type="application/json">{"similar":"Похожее объявление снято с публикации"}</script></body>'
+        )
+        self.assertFalse(cian_http.is_offer_removed(html))
+        self.assertFalse(cian_http.is_offer_removed(without_state(html)))
+
+    def test_removed_offer(self):
+        html = read_fixture("cian_detail_removed.html")
+        self.assertEqual(cian_http.extract_offer_state(html)["status"], "deactivated")
+        self.assertTrue(cian_http.is_offer_removed(html))
+        # Без состояния снятое объявление узнаётся по тексту страницы
+        self.assertTrue(cian_http.is_offer_removed(without_state(html)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+"""
+Адаптивный темп запросов к сайту.
+
+Вместо фиксированных пауз каждый запрос берёт токен из корзины своего хоста.
+Скорость пополнения корзины подстраивается по ответам: быстрые чистые ответы
+понемногу её поднимают, рост задержки снижает на шаг, страница-проверка
+(капча, «подтвердите, что вы не робот») или ошибка — на шаг побольше. Если
+проверки идут подряд, хост ставится на паузу: обход ждёт, а не продолжает
+ломиться в блокировку.
+Корзины общие для всех потоков процесса.
+"""
+import threading
+import time
+from urllib.parse import urlparse
+
+START_RATE = 1.0  # запросов в секунду на хост при старте
+MIN_RATE = 0.2
+MAX_RATE = 4.0
+RATE_STEP = 0.1  # шаг разгона/торможения (запросов в секунду)
+ERROR_STEP = 0.3  # шаг торможения после ошибки или страницы-проверки
+BURST = 2  # сколько запросов можно сделать подряд без ожидания
+SLOW_FACTOR = 2.0  # ответ «медленный», если дольше средней задержки в столько раз
+SLOW_MIN = 0.5  # ... и дольше стольких секунд (мелкие колебания не в счёт)
+BLOCK_AFTER = 3  # столько проверок/блокировок подряд — пауза
+BLOCK_PAUSE = 300  # секунд паузы хоста при блокировке
+
+OK = "ok"
+SLOW = "slow"
+ERROR = "error"
+CHALLENGE = "challenge"
+BLOCKED = "blocked"
+
+CHALLENGE_MARKERS = ("captcha", "робот", "подтвердите, что вы", "подозрительн", "необычный трафик")
+BLOCK_STATUSES = (403, 429)
+
+# Текст страницы, открытой в браузере, для проверки на капчу (одно обращение к драйверу)
+PAGE_CHECK_SCRIPT = """
+const body = document.body ? document.body.innerText.slice(0, 3000) : '';
+return document.title + '\\n' + body;
+"""
+
+
+def classify(status=None, text=None):
+    """Исход ответа по HTTP-статусу и тексту страницы: ok / error / challenge / blocked.
+
+    text — видимый текст (заголовок и body без скриптов), а не сырой HTML:
+    для HTTP-ответов его даёт cian_http.visible_text.
+    """
+    if status in BLOCK_STATUSES:
+        return BLOCKED
+    lower = (text or "").lower()
+    if any(marker in lower for marker in CHALLENGE_MARKERS):
+        return CHALLENGE
+    if status is not None and status != 200 and status not in (404, 410):
+        return ERROR
+    if status is None and text is None:
+        return ERROR
+    return OK
+
+
+def check_browser_page(driver):
+    """Исход для страницы, открытой в браузере (по заголовку и тексту)."""
+    try:
+        return classify(text=driver.execute_script(PAGE_CHECK_SCRIPT) or "")
+    except Exception:
+        return OK
+
+
+class HostThrottle:
+    """Корзина токенов одного хоста со скоростью, которая подстраивается под ответы."""
+
+    def __init__(self, host):
+        self.host = host
+        self.rate = START_RATE
+        self.tokens = float(BURST)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.avg_latency = None
+        self.strikes = 0  # проверок/блокировок подряд
+        self.stats = {"requests": 0, "waited": 0.0, "slow": 0, "errors": 0, "challenges": 0, "pauses": 0}
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(BURST, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Ждёт свой токен (и конец паузы, если хост на паузе)."""
+        started = time.monotonic()
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        self.stats["requests"] += 1
+                        self.stats["waited"] += now - started
+                        return
+                    delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+    def report(self, latency, outcome):
+        """Учитывает ответ: меняет скорость, при блокировке ставит хост на паузу."""
+        with self.lock:
+            if outcome == OK and self.avg_latency and latency > max(self.avg_latency * SLOW_FACTOR, SLOW_MIN):
+                outcome = SLOW
+            if outcome in (OK, SLOW):
+                self.avg_latency = latency if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * latency
+
+            if outcome == OK:
+                self.strikes = 0
+                self.rate = min(MAX_RATE, self.rate + RATE_STEP)
+            elif outcome == SLOW:
+                self.stats["slow"] += 1
+                self.rate = max(MIN_RATE, self.rate - RATE_STEP)
+            elif outcome == ERROR:
+                self.stats["errors"] += 1
+                self.rate = max(MIN_RATE, self.rate - ERROR_STEP)
+            else:
+                self.stats["challenges"] += 1
+                self.strikes += 1
+                self.rate = max(MIN_RATE, self.rate - ERROR_STEP)
+                if outcome == BLOCKED or self.strikes >= BLOCK_AFTER:
+                    self.paused_until = time.monotonic() + BLOCK_PAUSE
+                    self.strikes = 0
+                    self.tokens = 0.0
+                    self.rate = MIN_RATE
+                    self.stats["pauses"] += 1
+                    print(f" ⛔ {self.host}: похоже на блокировку, пауза {BLOCK_PAUSE} с")
+            return outcome
+
+
+_hosts = {}
+_hosts_lock = threading.Lock()
+
+
+def get_host(url):
+    """Корзина хоста из ссылки (создаётся при первом обращении)."""
+    host = urlparse(url).netloc.lower() or "-"
+    if host.startswith("www."):
+        host = host[4:]
+    with _hosts_lock:
+        throttle = _hosts.get(host)
+        if throttle is None:
+            throttle = _hosts[host] = HostThrottle(host)
+    return throttle
+
+
+def wait(url):
+    """Ждёт разрешения на запрос к хосту ссылки. Возвращает момент старта (для report)."""
+    get_host(url).acquire()
+    return time.monotonic()
+
+
+def report(url, started, outcome):
+    """Сообщает исход запроса, начатого в момент started (см. wait)."""
+    return get_host(url).report(time.monotonic() - started, outcome)
+
+
+def print_summary():
+    """Сводка темпа по хостам за запуск."""
+    with _hosts_lock:
+        hosts = list(_hosts.values())
+    for t in hosts:
+        with t.lock:
+            st = dict(t.stats)
+            rate = t.rate
+        if not st["requests"]:
+            continue
+        print(
+            f" Темп {t.host}: запросов {st['requests']}, сейчас {rate:.2f} запр/с, "
+            f"ожидание {st['waited']:.1f} с, медленных {st['slow']}, ошибок {st['errors']}, "
+            f"проверок {st['challenges']}, пауз {st['pauses']}"
+        )
@@ -16,46 +16,7 @@ import json
 import re
 from datetime import datetime, timedelta
 
-
-# Карта районов для основных городов России
-DISTRICT_MAPPING = {
-    "москва": {
-        "центр": ["Центральный", "Тверской", "Пресненский", "Арбат", "Хамовники", "Замоскворечье"],
-        "деловой_центр": ["Москва-Сити", "Пресненский", "Центральный", "Тверской"],
-        "окраины": ["Зеленоград", "Новокосино", "Митино", "Солнцево", "Южное Бутово", "Северное Бутово"],
-        "север": ["Северный", "Головинский", "Войковский"],
-        "юг": ["Южный", "Чертаново", "Бирюлёво"],
-        "восток": ["Восточный", "Измайлово", "Перово"],
-        "запад": ["Западный", "Кунцево", "Фили"]
-    },
-    "санкт-петербург": {
-        "центр": ["Центральный", "Адмиралтейский", "Петроградский"],
-        "деловой_центр": ["Центральный", "Адмиралтейский"],
-        "окраины": ["Курортный", "Пушкинский", "Колпинский"],
-        "север": ["Приморский", "Выборгский"],
-        "юг": ["Московский", "Фрунзенский"],
-        "восток": ["Невский", "Красногвардейский"],
-        "запад": ["Кировский", "Красносельский"]
-    },
-    "екатеринбург": {
-        "центр": ["Ленинский"],
-        "деловой_центр": ["Ленинский", "Верх-Исетский"],
-        "окраины": ["Железнодорожный", "Чкаловский"],
-        "север": ["Железнодорожный"],
-        "юг": ["Чкаловский"],
-        "восток": ["Орджоникидзевский"],
-        "запад": ["Верх-Исетский"]
-    },
-    "челябинск": {
-        "центр": ["Центральный", "Советский"],
-        "деловой_центр": ["Центральный"],
-        "окраины": ["Металлургический", "Тракторозаводский", "Ленинский"],
-        "север": ["Металлургический", "Курчатовский"],
-        "юг": ["Советский", "Ленинский"],
-        "восток": ["Тракторозаводский"],
-        "запад": ["Калининский", "Курчатовский"]
-    }
-}
+from districts import DISTRICT_MAPPING  # карта районов (её же использует индекс объявлений)
 
 
 class AIService:
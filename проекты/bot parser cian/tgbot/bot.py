@@ -22,6 +22,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Сколько ближайших к критериям объявлений показывать, если точных совпадений нет
+NEAREST_LISTINGS_LIMIT = 15
+
 
 HELP_TEXT = """📚 Справка по использованию бота:
 
@@ -821,6 +824,10 @@ async def show_listings_page(update: Update, context: ContextTypes.DEFAULT_TYPE,
             warnings_text = " и ".join(warnings)
             listings_text += f"⚠️ **Внимание:** В указанном диапазоне ({warnings_text}) не найдено подходящих помещений.\n"
             listings_text += f"Показаны объявления, максимально близкие к вашим критериям:\n\n"
+        else:
+            # Не совпал только район (или их сочетание) - всё равно это ближайшие варианты
+            listings_text += "⚠️ **Внимание:** Точных совпадений не найдено.\n"
+            listings_text += "Показаны объявления, максимально близкие к вашим критериям:\n\n"
     
     for i, listing in enumerate(current_listings, 1):
         global_index = start_idx + i
@@ -1330,7 +1337,7 @@ async def process_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         # Получаем объявления от парсера
         excluded_ids = session.get("excluded_listing_ids", [])
-        listings = parse_listings(
+        search_params = dict(
             city=criteria["city"],
             district=criteria.get("district"),
             min_area=criteria["area_min"],
@@ -1341,6 +1348,14 @@ async def process_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
             excluded_ids=excluded_ids,
             deal_type=criteria.get("deal_type")
         )
+        listings = parse_listings(**search_params)
+        
+        # Точных совпадений нет - показываем максимально близкие к критериям
+        # (с предупреждением), а анализ и предложения ИИ - только если в городе пусто
+        near_miss = False
+        if not listings:
+            listings = parse_listings(**search_params, nearest=NEAREST_LISTINGS_LIMIT)
+            near_miss = bool(listings)
         
         if not listings:
             session["state"] = BotState.WAITING_REQUEST
@@ -1489,7 +1504,7 @@ async def process_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
             session["floor_mismatch"] = False
         
         # Сохраняем общий флаг несоответствия критериям
-        session["criteria_exceeded"] = budget_exceeded or area_exceeded or floor_mismatch
+        session["criteria_exceeded"] = budget_exceeded or area_exceeded or floor_mismatch or near_miss
         
         # Если ИИ доступен, анализируем объявления (ранжируем все)
         # Передаем причину дизлайка, если есть
@@ -2008,8 +2023,12 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         all_listings = session.get("all_listings", [])
         listings_to_compare = [l for l in all_listings if l.get('id') in comparison_list]
         
-        # Если каких-то нет в памяти (странно, но возможно), пробуем восстановить из favorites/dislikes или просто пропускаем
-        # Для простоты берем только те, что нашли
+        # Если каких-то нет в памяти (например, после нового поиска), берём их из CSV одним запросом
+        found_ids = {l.get('id') for l in listings_to_compare}
+        missing_ids = [i for i in comparison_list if i not in found_ids]
+        if missing_ids:
+            from parser import get_listings_by_ids
+            listings_to_compare.extend(get_listings_by_ids(missing_ids))
         
         if len(listings_to_compare) < 2:
              await query.edit_message_text("❌ Не удалось найти данные объявлений для сравнения.")
@@ -0,0 +1,560 @@
+"""
+Репозиторий объявлений: CSV парсера загружаются в память один раз
+и перечитываются, только когда файл на диске изменился (mtime или размер).
+Числовые поля хранятся столбцами NumPy: критерии поиска — булевы маски
+"""
+import csv
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from districts import DISTRICT_MAPPING
+
+PARSER_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "parser")
+PHONE_CACHE_PATH = os.path.join(PARSER_DIR, "phone_cache.sqlite3")
+CRAWL_JOURNAL_PATH = os.path.join(PARSER_DIR, "crawl_journal.sqlite3")
+
+# Маппинг городов для поиска CSV файлов
+CITY_FILES = {
+    "москва": "moscow",
+    "санкт-петербург": "spb",
+    "екатеринбург": "ekaterinburg",
+    "челябинск": "chelyabinsk"
+}
+
+DEAL_CODES = {"rent": 0, "sale": 1}
+
+# Веса «расстояния» до критериев для поиска ближайших объявлений (Dataset.nearest)
+DISTRICT_PENALTY = 10_000_000  # не тот район — в самый конец
+FLOOR_PENALTY = 5_000_000  # не тот этаж
+AREA_WEIGHT = 1000  # за каждый м² за пределами диапазона площади
+PRICE_WEIGHT = 2  # за каждый рубль за пределами бюджета
+BUDGET_WEIGHT = 0.1  # за каждый рубль ниже max_price: ближе к бюджету — лучше
+_NO_POSITIONS = np.array([], dtype=np.int64)
+
+_CIAN_ID_RE = re.compile(r'/(\d+)/')
+_DISTRICT_IN_ADDRESS_RE = re.compile(r"(?:^|,)\s*(?:р-н|район)\s+([^,]+)|(?:^|,)\s*([^,]+?)\s+(?:р-н|район)\s*(?:,|$)", re.IGNORECASE)
+_DISTRICT_ENDING_RE = re.compile(r"(ского|ском|ский|ская|ское|ого|ому|ый|ий|ой|ая|ое|ом)$")
+
+
+@lru_cache(maxsize=4096)
+def district_key(name: str) -> str:
+    """
+    Ключ района для сравнения: нижний регистр, без "район"/"р-н" и окончания
+    ("Ленинский район" → "ленин", "Центральном" → "центральн")
+    """
+    key = (name or "").lower().replace("ё", "е").replace("р-н", " ").replace("район", " ")
+    key = " ".join(key.split())
+    return _DISTRICT_ENDING_RE.sub("", key) or key
+
+
+def location_fields(row: Dict) -> Dict:
+    """
+    Части адреса из колонок CSV (их заполняет парсер, parser/addresses.py)
+
+    Для старых CSV без этих колонок район достаётся из адреса по "р-н ...".
+    """
+    district = row.get("Район") or ""
+    if not district:
+        m = _DISTRICT_IN_ADDRESS_RE.search(row.get("Адрес") or "")
+        district = (m.group(1) or m.group(2)).strip() if m else ""
+    return {
+        "region": row.get("Регион") or "",
+        "city": row.get("Город") or "",
+        "district": district,
+        "street": row.get("Улица") or "",
+    }
+
+
+@dataclass(frozen=True)
+class Listing:
+    """Объявление в памяти; наружу отдаётся копией-словарём (to_dict)"""
+    id: int
+    address: str
+    area: float
+    price: int
+    floor: int
+    deal_type: str
+    description: str
+    link: str
+    phone: str = ""
+    traffic: str = "неизвестно"
+    accessibility: str = "неизвестно"
+    region: str = ""
+    city: str = ""
+    district: str = ""
+    street: str = ""
+
+    @property
+    def searchable(self) -> bool:
+        """Бизнес-правила: адекватная цена, информативное описание, положительная площадь"""
+        return self.price >= 1000 and len(self.description) >= 10 and self.area > 0
+
+    def to_dict(self, phones: Dict[str, str] = None) -> Dict:
+        """Словарь в прежнем формате объявления (телефон — из CSV или кэша отложенных)"""
+        listing = dict(self.__dict__)
+        listing["phone"] = self.phone or (phones or {}).get(self.link) or "Не указан"
+        return listing
+
+
+def listing_id_for(link: str, address: str, price, area) -> int:
+    """Стабильный ID: номер объявления ЦИАН из ссылки или хеш от ссылки/адреса"""
+    if link and "cian.ru" in link:
+        match = _CIAN_ID_RE.search(link)
+        if match:
+            return int(match.group(1))
+    unique_str = link if link else f"{address}{price}{area}"
+    return int(str(int(hashlib.md5(unique_str.encode('utf-8')).hexdigest(), 16))[:10])
+
+
+def listing_from_row(row: Dict, deal_type: str) -> Listing:
+    """Строка CSV парсера → Listing (цена, площадь и этаж приводятся к числам)"""
+    price_str = (row.get("Цена") or "").replace(" ", "").replace("₽/мес.", "").replace("\xa0", "")
+    price = int(price_str) if price_str.isdigit() else 0
+
+    area_str = (row.get("Площадь") or "").replace(" м²", "").replace(",", ".").replace("\xa0", "")
+    area = float(area_str) if area_str.replace(".", "").isdigit() else 0.0
+
+    try:
+        floor_num = int(''.join(filter(str.isdigit, str(row.get("Этаж") or "1"))) or "1")
+    except (ValueError, TypeError):
+        floor_num = 1
+
+    link = row.get("Ссылка") or ""
+    return Listing(
+        id=listing_id_for(link, row.get("Адрес"), price, area),
+        address=row.get("Адрес") or "",
+        area=area,
+        price=price,
+        floor=floor_num,
+        deal_type=deal_type,
+        description=f"{row.get('Тип помещения') or ''}. {row.get('Этажей в доме') or ''} этажей.",
+        link=link,
+        phone=row.get("Телефон") or "",
+        **location_fields(row),
+    )
+
+
+def city_from_path(path: Optional[str]) -> str:
+    """Город (в нижнем регистре) по имени файла <город>_cian_<сделка>.csv"""
+    name = os.path.basename(path or "")
+    for city, english_name in CITY_FILES.items():
+        if name.startswith(f"{english_name}_cian"):
+            return city
+    return ""
+
+
+def deal_type_from_path(path: str) -> str:
+    """Тип сделки по имени файла <город>_cian_<сделка>.csv"""
+    name = os.path.basename(path)
+    return "rent" if "_rent" in name else "sale" if "_sale" in name else "rent"
+
+
+def file_signature(*paths: str) -> Tuple:
+    """(mtime, размер) файлов — признак того, что их пора перечитать"""
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class Dataset:
+    """
+    Неизменяемый снимок одного CSV: при изменении файла заменяется целиком
+
+    Объявления, прошедшие бизнес-правила, дополнительно лежат столбцами
+    (площадь, цена, этаж, цена за м², тип сделки), а район и город — в
+    инвертированном индексе «ключ → отсортированные позиции объявлений».
+    Фильтр по району и городу — объединение и пересечение списков позиций,
+    остальные критерии — векторная маска только по найденным позициям.
+    """
+
+    def __init__(self, path: Optional[str], signature: Tuple, records: Iterable[Listing]):
+        self.path = path
+        self.signature = signature
+        self.deal_type = deal_type_from_path(path) if path else "rent"
+        self.records = tuple(records)
+        self.searchable = tuple(r for r in self.records if r.searchable)
+        self.by_id = {}
+        for record in self.records:
+            self.by_id.setdefault(record.id, record)
+        self._build_columns()
+        self._build_index()
+        self._city_cache: Dict[str, np.ndarray] = {}
+        self._active: Tuple[Optional[Set[str]], Optional[np.ndarray]] = (None, None)
+
+    def _build_columns(self):
+        rows = self.searchable
+        n = len(rows)
+        self.ids = np.fromiter((r.id for r in rows), dtype=np.int64, count=n)
+        self.positions = {r.id: i for i, r in enumerate(rows)}
+        self.area = np.fromiter((r.area for r in rows), dtype=np.float64, count=n)
+        self.price = np.fromiter((r.price for r in rows), dtype=np.int64, count=n)
+        self.floor = np.fromiter((r.floor for r in rows), dtype=np.int32, count=n)
+        self.price_per_m2 = self.price / self.area  # площадь > 0 по бизнес-правилам
+        self.deal = np.fromiter((DEAL_CODES.get(r.deal_type, 0) for r in rows), dtype=np.int8, count=n)
+
+    def _build_index(self):
+        """Постинги районов и городов, включая псевдонимы из DISTRICT_MAPPING ("центр" → Ленинский)"""
+        district_rows: Dict[str, List[int]] = {}
+        city_rows: Dict[str, List[int]] = {}
+        unresolved = []  # без колонки города и не из CSV города (мок-данные): город ищется в адресе
+        default_city = city_from_path(self.path)
+        for i, r in enumerate(self.searchable):
+            key = district_key(r.district)
+            if key:
+                district_rows.setdefault(key, []).append(i)
+            city = r.city.lower() or default_city
+            if city:
+                city_rows.setdefault(city, []).append(i)
+            else:
+                unresolved.append(i)
+        # Позиции добавлялись по возрастанию, так что списки уже отсортированы
+        self.district_postings = {k: np.array(v, dtype=np.int64) for k, v in district_rows.items()}
+        self.city_postings = {k: np.array(v, dtype=np.int64) for k, v in city_rows.items()}
+        self._unresolved_city = np.array(unresolved, dtype=np.int64)
+
+        canonical = dict(self.district_postings)
+        for city, city_positions in self.city_postings.items():
+            for alias, districts in DISTRICT_MAPPING.get(city, {}).items():
+                parts = [canonical[k] for k in {district_key(d) for d in districts} if k in canonical]
+                if not parts:
+                    continue
+                alias_positions = np.intersect1d(np.concatenate(parts), city_positions)
+                for alias_key in {district_key(alias), district_key(alias.replace("_", " "))}:
+                    existing = self.district_postings.get(alias_key)
+                    self.district_postings[alias_key] = (
+                        alias_positions if existing is None else np.union1d(existing, alias_positions)
+                    )
+
+    @property
+    def size(self) -> int:
+        return len(self.searchable)
+
+    @classmethod
+    def load(cls, path: str) -> "Dataset":
+        signature = file_signature(path)
+        deal_type = deal_type_from_path(path)
+        records = []
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                try:
+                    records.append(listing_from_row(row, deal_type))
+                except Exception:
+                    continue
+        return cls(path, signature, records)
+
+    def active_mask(self, inactive: Set[str]) -> np.ndarray:
+        """Маска объявлений, не снятых с публикации (пересчитывается при смене набора ссылок)"""
+        cached_for, mask = self._active
+        if cached_for is not inactive or mask is None:
+            mask = np.fromiter((r.link not in inactive for r in self.searchable), dtype=bool, count=self.size)
+            self._active = (inactive, mask)
+        return mask
+
+    def city_positions(self, city: str) -> np.ndarray:
+        """Позиции объявлений города (для строк без города — поиск в адресе, один раз на город)"""
+        city = city.lower()
+        positions = self._city_cache.get(city)
+        if positions is None:
+            positions = self.city_postings.get(city, _NO_POSITIONS)
+            if self._unresolved_city.size:
+                found = [i for i in self._unresolved_city if city in self.searchable[i].address.lower()]
+                positions = np.union1d(positions, np.array(found, dtype=np.int64))
+            self._city_cache[city] = positions
+        return positions
+
+    def district_positions(self, district_keys: Iterable[str]) -> np.ndarray:
+        """Объединение постингов районов (ключи district_key, псевдонимы уже в индексе)"""
+        parts = [self.district_postings[k] for k in district_keys if k in self.district_postings]
+        if not parts:
+            return _NO_POSITIONS
+        if len(parts) == 1:
+            return parts[0]
+        return np.unique(np.concatenate(parts))
+
+    def match(self, city: str = None, district_keys: Set[str] = None, min_area: float = None,
+              max_area: float = None, min_price: float = None, max_price: float = None,
+              floor: int = None, excluded_ids: Iterable[int] = None, deal_type: str = None,
+              inactive: Set[str] = None) -> np.ndarray:
+        """
+        Позиции (в searchable) объявлений, подходящих под все критерии
+
+        Пустые критерии (None, 0) не ограничивают поиск — как в прежнем parse_listings.
+        """
+        rows = None  # кандидаты из индекса; None — все объявления
+        if city:
+            rows = self.city_positions(city)
+        if district_keys:
+            found = self.district_positions(district_keys)
+            rows = found if rows is None else np.intersect1d(rows, found, assume_unique=True)
+        if rows is not None and not rows.size:
+            return rows
+
+        def column(values):
+            return values if rows is None else values[rows]
+
+        size = self.size if rows is None else rows.size
+        mask = np.ones(size, dtype=bool)
+        scratch = np.empty(size, dtype=bool)  # промежуточная маска без новых выделений памяти
+
+        def narrow(op, values, value):
+            op(column(values), value, out=scratch)
+            np.logical_and(mask, scratch, out=mask)
+
+        if inactive:
+            mask &= column(self.active_mask(inactive))
+        if min_area:
+            narrow(np.greater_equal, self.area, min_area)
+        if max_area:
+            narrow(np.less_equal, self.area, max_area)
+        if min_price:
+            narrow(np.greater_equal, self.price, min_price)
+        if max_price:
+            narrow(np.less_equal, self.price, max_price)
+        if floor is not None:
+            narrow(np.equal, self.floor, int(floor))
+        if deal_type in DEAL_CODES:
+            narrow(np.equal, self.deal, DEAL_CODES[deal_type])
+
+        result = np.flatnonzero(mask) if rows is None else rows[mask]
+        if excluded_ids:
+            excluded = [self.positions.get(i) for i in excluded_ids]
+            excluded = np.array([p for p in excluded if p is not None], dtype=np.int64)
+            if excluded.size:
+                result = np.setdiff1d(result, excluded, assume_unique=True)
+        return result
+
+    def distance(self, rows: np.ndarray, district_keys: Set[str] = None, min_area: float = None,
+                 max_area: float = None, min_price: float = None, max_price: float = None,
+                 floor: int = None) -> np.ndarray:
+        """Взвешенное «расстояние» объявлений rows до критериев (0 — полное совпадение)"""
+        distance = np.zeros(rows.size)
+        if district_keys:
+            in_district = np.zeros(self.size, dtype=bool)
+            in_district[self.district_positions(district_keys)] = True
+            distance[~in_district[rows]] += DISTRICT_PENALTY
+        if floor is not None:
+            distance[self.floor[rows] != int(floor)] += FLOOR_PENALTY
+
+        area = self.area[rows]
+        if min_area or max_area:
+            gap = np.zeros(rows.size)
+            if max_area:
+                gap = np.where(area > max_area, area - max_area, gap)
+            if min_area:
+                gap = np.where(area < min_area, min_area - area, gap)
+            distance += gap * AREA_WEIGHT
+
+        price = self.price[rows].astype(np.float64)
+        if min_price or max_price:
+            gap = np.zeros(rows.size)
+            if max_price:
+                gap = np.where(price > max_price, (price - max_price) * PRICE_WEIGHT,
+                               (max_price - price) * BUDGET_WEIGHT)
+            if min_price:
+                gap = np.where(price < min_price, (min_price - price) * PRICE_WEIGHT, gap)
+            distance += gap
+        return distance
+
+    def nearest(self, k: int, city: str = None, district_keys: Set[str] = None, min_area: float = None,
+                max_area: float = None, min_price: float = None, max_price: float = None,
+                floor: int = None, excluded_ids: Iterable[int] = None, deal_type: str = None,
+                inactive: Set[str] = None) -> np.ndarray:
+        """
+        Позиции k объявлений, ближайших к критериям, от ближайшего к дальнему
+
+        Город, тип сделки, исключённые ID и снятые с публикации — жёсткие фильтры
+        (как в match), а район, этаж, площадь и бюджет дают штрафы distance().
+        Расстояние считается одним векторным выражением по всем кандидатам,
+        лучшие k выбираются частичной сортировкой (argpartition), а не полной.
+        """
+        rows = self.match(city=city, excluded_ids=excluded_ids, deal_type=deal_type, inactive=inactive)
+        if k <= 0 or not rows.size:
+            return rows[:0]
+        distance = self.distance(rows, district_keys, min_area, max_area, min_price, max_price, floor)
+        best = np.argpartition(distance, k - 1)[:k] if k < rows.size else np.arange(rows.size)
+        return rows[best[np.argsort(distance[best], kind="stable")]]
+
+    def records_at(self, indices: np.ndarray) -> List[Listing]:
+        rows = self.searchable
+        return [rows[i] for i in indices]
+
+
+class ListingRepository:
+    """Кэш датасетов (город, сделка) и служебных таблиц парсера на время жизни процесса"""
+
+    def __init__(self, parser_dir: str = PARSER_DIR):
+        self.parser_dir = parser_dir
+        self._datasets: Dict[str, Dataset] = {}
+        self._by_id: Dict[int, Tuple[str, Listing]] = {}  # id → (CSV, объявление) по всем загруженным снимкам
+        self._phones: Tuple[Tuple, Dict[str, str]] = ((), {})
+        self._inactive: Tuple[Tuple, Set[str]] = ((), set())
+        self._lock = threading.Lock()
+
+    def csv_path(self, city: Optional[str], deal_type: Optional[str]) -> Optional[str]:
+        """Путь к CSV города и сделки (без города — Екатеринбург, как раньше)"""
+        if city:
+            english_name = CITY_FILES.get(city.lower())
+            if not english_name:
+                return None
+            deal_suffix = "_rent" if deal_type == "rent" else "_sale" if deal_type == "sale" else ""
+        else:
+            english_name = "ekaterinburg"
+            deal_suffix = "_rent" if deal_type == "rent" else "_sale" if deal_type == "sale" else "_rent"
+        return os.path.join(self.parser_dir, f"{english_name}_cian{deal_suffix}.csv")
+
+    def csv_paths(self, city: Optional[str] = None, deal_type: Optional[str] = None) -> List[str]:
+        """CSV для поиска по ID: города (обе сделки, если тип не задан) или все файлы парсера"""
+        if city:
+            english_name = CITY_FILES.get(city.lower())
+            if not english_name:
+                return []
+            deals = [deal_type] if deal_type else ["rent", "sale"]
+            return [os.path.join(self.parser_dir, f"{english_name}_cian_{deal}.csv") for deal in deals]
+        if not os.path.exists(self.parser_dir):
+            return []
+        return [
+            os.path.join(self.parser_dir, name)
+            for name in sorted(os.listdir(self.parser_dir)) if name.endswith(".csv")
+        ]
+
+    def dataset(self, path: str) -> Optional[Dataset]:
+        """Снимок CSV; перечитывается, только если у файла сменились mtime или размер"""
+        current = self._datasets.get(path)
+        signature = file_signature(path)
+        if signature == (None,):
+            return None
+        if current is not None and current.signature == signature:
+            return current
+        try:
+            fresh = Dataset.load(path)
+        except Exception as e:
+            print(f"Ошибка чтения CSV: {e}")
+            return current
+        with self._lock:
+            self._datasets[path] = fresh  # подмена ссылки: читатели видят старый или новый снимок целиком
+            self._reindex(path, current, fresh)
+        return fresh
+
+    def _reindex(self, path: str, stale: Optional[Dataset], fresh: Dataset):
+        """Переносит глобальный индекс id со старого снимка файла на новый (под блокировкой)"""
+        if stale is not None:
+            for listing_id in stale.by_id.keys() - fresh.by_id.keys():
+                owner = self._by_id.get(listing_id)
+                if owner is not None and owner[0] == path:
+                    del self._by_id[listing_id]
+        for listing_id, record in fresh.by_id.items():
+            owner = self._by_id.get(listing_id)
+            if owner is None or owner[0] == path:
+                self._by_id[listing_id] = (path, record)
+
+    def load_all(self):
+        """Загружает (или обновляет по mtime/размеру) все CSV парсера в глобальный индекс id"""
+        for path in self.csv_paths():
+            self.dataset(path)
+
+    def phones(self) -> Dict[str, str]:
+        """Телефоны, полученные отложенно (parser/phone_resolver.py) для избранного"""
+        signature = file_signature(PHONE_CACHE_PATH, PHONE_CACHE_PATH + "-wal")
+        if signature != self._phones[0]:
+            self._phones = (signature, load_phone_cache())
+        return self._phones[1]
+
+    def inactive_links(self) -> Set[str]:
+        """Ссылки объявлений, снятых с публикации (по данным parser/refresh.py)"""
+        signature = file_signature(CRAWL_JOURNAL_PATH, CRAWL_JOURNAL_PATH + "-wal")
+        if signature != self._inactive[0]:
+            self._inactive = (signature, load_inactive_links())
+        return self._inactive[1]
+
+    def search_dataset(self, city: Optional[str], deal_type: Optional[str]) -> Optional[Dataset]:
+        """Снимок CSV города и сделки для поиска (None, если файла нет)"""
+        path = self.csv_path(city, deal_type)
+        return self.dataset(path) if path else None
+
+    def find_many(self, listing_ids: Iterable[int]) -> Dict[int, Listing]:
+        """
+        Объявления по ID из глобального индекса (снятые с публикации пропускаются)
+
+        Свежесть проверяется только у CSV найденных объявлений; все файлы парсера
+        перебираются один раз на вызов и только если часть ID в индексе не нашлась.
+        Тип сделки объявления — Listing.deal_type (по имени файла).
+        """
+        found: Dict[int, Listing] = {}
+        missing = []
+        checked = set()  # CSV, уже сверенные с диском в этом вызове
+        for listing_id in listing_ids:
+            entry = self._by_id.get(listing_id)
+            if entry is not None and entry[0] not in checked:
+                checked.add(entry[0])
+                self.dataset(entry[0])
+                entry = self._by_id.get(listing_id)
+            if entry is None:
+                missing.append(listing_id)
+            else:
+                found[listing_id] = entry[1]
+        if missing:
+            self.load_all()
+            for listing_id in missing:
+                entry = self._by_id.get(listing_id)
+                if entry is not None:
+                    found[listing_id] = entry[1]
+        inactive = self.inactive_links()
+        return {listing_id: record for listing_id, record in found.items() if record.link not in inactive}
+
+    def find(self, listing_id: int) -> Optional[Listing]:
+        """Объявление по ID за O(1) (None, если нет ни в одном CSV или снято)"""
+        return self.find_many([listing_id]).get(listing_id)
+
+
+def load_phone_cache() -> Dict[str, str]:
+    """
+    Телефоны, полученные отложенно (parser/phone_resolver.py) для избранного
+
+    Returns:
+        Словарь {ссылка: телефон}
+    """
+    if not os.path.exists(PHONE_CACHE_PATH):
+        return {}
+    try:
+        conn = sqlite3.connect(PHONE_CACHE_PATH)
+        rows = conn.execute("SELECT url, phone FROM phones WHERE phone IS NOT NULL").fetchall()
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Ошибка чтения кэша телефонов: {e}")
+        return {}
+    return {url: phone for url, phone in rows}
+
+
+def load_inactive_links() -> set:
+    """
+    Ссылки объявлений, снятых с публикации (по данным parser/refresh.py)
+
+    Returns:
+        Множество ссылок
+    """
+    if not os.path.exists(CRAWL_JOURNAL_PATH):
+        return set()
+    try:
+        conn = sqlite3.connect(CRAWL_JOURNAL_PATH)
+        rows = conn.execute("SELECT url FROM listing_state WHERE active = 0").fetchall()
+        conn.close()
+    except sqlite3.Error:
+        return set()
+    return {url for (url,) in rows}
+
+
+# Общий на процесс репозиторий (бот и фоновая проверка новых объявлений)
+repository = ListingRepository()
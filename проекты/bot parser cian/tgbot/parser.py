@@ -4,13 +4,16 @@
 """
 from typing import List, Dict
 import random
-import os
-import csv
-import re
-import hashlib
 
+from listing_repository import (
+    Dataset,
+    Listing,
+    repository,
+    district_key,
+)
 
-def parse_listings(city: str = None, district: str = None, min_area: int = None, max_area: int = None, min_price: int = None, max_price: int = None, floor: int = None, excluded_ids: List[int] = None, deal_type: str = None) -> List[Dict]:
+
+def parse_listings(city: str = None, district: str = None, min_area: int = None, max_area: int = None, min_price: int = None, max_price: int = None, floor: int = None, excluded_ids: List[int] = None, deal_type: str = None, nearest: int = 0) -> List[Dict]:
     """
     Парсит объявления о помещениях по заданным критериям
     
@@ -24,6 +27,7 @@ def parse_listings(city: str = None, district: str = None, min_area: int = None,
         floor: Этаж
         excluded_ids: Список ID объявлений для исключения
         deal_type: Тип сделки ('rent' - аренда, 'sale' - продажа)
+        nearest: Если точных совпадений нет, вернуть столько ближайших к критериям (0 - не искать)
     
     Returns:
         Список словарей с данными об объявлениях
@@ -34,89 +38,14 @@ def parse_listings(city: str = None, district: str = None, min_area: int = None,
     # Определяем город для адресов
     city_name = city if city else "Екатеринбург"  # По умолчанию Екатеринбург, если город не указан
     
-    listings = []
-    
-    # Попытка загрузить из CSV (если есть)
-    # Ищем CSV в папке parser на уровень выше
-    
-    # Маппинг городов для поиска CSV файлов
-    city_mapping = {
-        "москва": "moscow",
-        "санкт-петербург": "spb",
-        "екатеринбург": "ekaterinburg",
-        "челябинск": "chelyabinsk"
-    }
-    
-    csv_path = None
-    if city:
-        english_name = city_mapping.get(city.lower())
-        if english_name:
-            # Формируем имя файла в зависимости от типа сделки
-            deal_suffix = "_rent" if deal_type == "rent" else "_sale" if deal_type == "sale" else ""
-            csv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "parser", f"{english_name}_cian{deal_suffix}.csv")
-    else:
-        # Если город не указан, пробуем загрузить Екатеринбург как дефолтный
-        deal_suffix = "_rent" if deal_type == "rent" else "_sale" if deal_type == "sale" else "_rent"
-        csv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "parser", f"ekaterinburg_cian{deal_suffix}.csv")
-    
-    if csv_path and os.path.exists(csv_path):
-        try:
-            with open(csv_path, 'r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                for i, row in enumerate(reader):
-                    try:
-                        # Парсим цену
-                        price_str = row.get("Цена", "").replace(" ", "").replace("₽/мес.", "").replace("\xa0", "")
-                        price = int(price_str) if price_str.isdigit() else 0
-                        
-                        # Парсим площадь
-                        area_str = row.get("Площадь", "").replace(" м²", "").replace(",", ".").replace("\xa0", "")
-                        area = float(area_str) if area_str.replace(".", "").isdigit() else 0.0
-                        
-                        # Парсим этаж (извлекаем только число)
-                        floor_str = row.get("Этаж", "1")
-                        try:
-                            # Извлекаем первое число из строки
-                            floor_num = int(''.join(filter(str.isdigit, str(floor_str))) or "1")
-                        except (ValueError, TypeError):
-                            floor_num = 1
-                        
-                        # Генерируем стабильный ID
-                        link = row.get("Ссылка", "")
-                        listing_id = None
-                        
-                        # Пытаемся извлечь ID из ссылки CIAN
-                        if link and "cian.ru" in link:
-                            match = re.search(r'/(\d+)/', link)
-                            if match:
-                                listing_id = int(match.group(1))
-                        
-                        # Если не удалось, используем хеш от ссылки или адреса
-                        if not listing_id:
-                            unique_str = link if link else f"{row.get('Адрес')}{price}{area}"
-                            listing_id = int(str(int(hashlib.md5(unique_str.encode('utf-8')).hexdigest(), 16))[:10])
-
-                        listing = {
-                            "id": listing_id,
-                            "address": row.get("Адрес", ""),
-                            "area": area,
-                            "price": price,
-                            "floor": floor_num,
-                            "deal_type": deal_type if deal_type else "rent",  # Используем переданный тип сделки
-                            "description": f"{row.get('Тип помещения', '')}. {row.get('Этажей в доме', '')} этажей.",
-                            "traffic": "неизвестно",
-                            "accessibility": "неизвестно",
-                            "link": row.get("Ссылка", ""),
-                            "phone": row.get("Телефон", "Не указан")
-                        }
-                        listings.append(listing)
-                    except Exception as e:
-                        continue
-        except Exception as e:
-            print(f"Ошибка чтения CSV: {e}")
+    # Объявления из CSV парсера: загружены в память один раз и перечитываются
+    # только при изменении файла (listing_repository.py)
+    inactive_links = repository.inactive_links()
+    dataset = repository.search_dataset(city, deal_type)
+    has_listings = dataset is not None and bool(dataset.active_mask(inactive_links).any())
 
     # Если CSV пуст или не найден, используем мок-данные
-    if not listings:
+    if not has_listings:
         mock_listings = [
         {
             "id": 1,
@@ -602,174 +531,49 @@ def parse_listings(city: str = None, district: str = None, min_area: int = None,
     ]
     
     # Если listings пуст (не загрузился CSV), используем mock_listings
-    if not listings:
-        listings = mock_listings
-
-    # Применяем бизнес-правила фильтрации (Business Rules)
-    filtered_listings = []
-    for l in listings:
-        # 1. Цена должна быть адекватной (>= 1000)
-        if l.get("price", 0) < 1000:
-            continue
-        
-        # 2. Описание должно быть информативным (>= 10 символов)
-        if len(l.get("description", "")) < 10:
-            continue
-            
-        # 3. Площадь должна быть положительной
-        if l.get("area", 0) <= 0:
-            continue
-            
-        filtered_listings.append(l)
-    
-    listings = filtered_listings
+    if not has_listings:
+        # Бизнес-правила (цена >= 1000, описание >= 10 символов, площадь > 0)
+        # применяются при построении Dataset, как и для CSV
+        dataset = Dataset(None, (), [Listing(**m) for m in mock_listings])
 
-    # Фильтруем по критериям
-    if excluded_ids is None:
-        excluded_ids = []
-    
-    # Исключаем объявления по ID
-    available_listings = [l for l in listings if l["id"] not in excluded_ids]
-    
-    # Строгая фильтрация по району (если указан)
+    # Район: ключи для сравнения с колонкой района, без поиска в адресе
+    district_keys = set()
     if district:
-        filtered_by_district = []
-        for listing in available_listings:
-            is_match = False
-            if isinstance(district, list):
-                for d in district:
-                    clean_d = d.lower().replace("район", "").replace("р-н", "").replace("ский", "").replace("ый", "").strip()
-                    # Для "Центральный" ищем "центр", для "Ленинский" - "ленин"
-                    if clean_d and clean_d in listing["address"].lower():
-                        is_match = True
-                        break
-            else:
-                clean_district = district.lower().replace("район", "").replace("р-н", "").replace("ский", "").replace("ый", "").strip()
-                # Для "Центральный" ищем "центр", для "Ленинский" - "ленин"
-                if clean_district and clean_district in listing["address"].lower():
-                    is_match = True
-            
-            if is_match:
-                filtered_by_district.append(listing)
-        
-        available_listings = filtered_by_district
+        district_keys = {district_key(d) for d in (district if isinstance(district, list) else [district])}
+        district_keys.discard("")
 
-    if not available_listings:
-        return []
-    
-    # Функция для проверки, соответствует ли объявление всем критериям
-    def matches_all_criteria(listing):
-        # Проверка города (если указан)
-        if city and city.lower() not in listing["address"].lower():
-            return False
+    # Объявления, полностью соответствующие всем критериям: одна векторная маска
+    # (город, район, площадь, бюджет, этаж, исключённые ID, снятые с публикации)
+    indices = dataset.match(
+        city=city,
+        district_keys=district_keys,
+        min_area=min_area,
+        max_area=max_area,
+        min_price=min_price,
+        max_price=max_price,
+        floor=floor,
+        excluded_ids=excluded_ids,
+        inactive=inactive_links,
+    )
 
-        # Проверка района
-        if district:
-            if isinstance(district, list):
-                # Если список районов, проверяем, есть ли хотя бы один из них в адресе
-                found = False
-                for d in district:
-                    clean_d = d.lower().replace("район", "").replace("р-н", "").replace("ский", "").replace("ый", "").strip()
-                    # Для "Центральный" ищем "центр", для "Ленинский" - "ленин"
-                    if clean_d and clean_d in listing["address"].lower():
-                        found = True
-                        break
-                if not found:
-                    return False
-            else:
-                # Нормализуем название района для поиска
-                clean_district = district.lower().replace("район", "").replace("р-н", "").replace("ский", "").replace("ый", "").strip()
-                # Для "Центральный" ищем "центр", для "Ленинский" - "ленин"
-                if clean_district and clean_district not in listing["address"].lower():
-                    return False
+    # Если идеальных совпадений нет - ищем максимально близкие по всем критериям:
+    # штрафы за район и этаж, разрыв по площади и бюджету (Dataset.distance)
+    if not indices.size and nearest:
+        indices = dataset.nearest(
+            nearest,
+            city=city,
+            district_keys=district_keys,
+            min_area=min_area,
+            max_area=max_area,
+            min_price=min_price,
+            max_price=max_price,
+            floor=floor,
+            excluded_ids=excluded_ids,
+            inactive=inactive_links,
+        )
 
-        # Проверка площади
-        if min_area and listing["area"] < min_area:
-            return False
-        if max_area and listing["area"] > max_area:
-            return False
-        # Проверка бюджета
-        if min_price and listing["price"] < min_price:
-            return False
-        if max_price and listing["price"] > max_price:
-            return False
-            
-        # Проверка этажа
-        if floor is not None:
-            try:
-                listing_floor = int(listing.get("floor", 0))
-                if listing_floor != floor:
-                    return False
-            except (ValueError, TypeError):
-                pass
-                
-        return True
-    
-    # Функция для вычисления "расстояния" от объявления до критериев (чем меньше, тем ближе)
-    def calculate_distance(listing):
-        distance = 0
-        
-        # Штраф за несовпадение района (очень большой)
-        if district:
-            is_match = False
-            if isinstance(district, list):
-                for d in district:
-                    clean_d = d.lower().replace("район", "").replace("р-н", "").replace("ский", "").replace("ый", "").strip()
-                    # Для "Центральный" ищем "центр", для "Ленинский" - "ленин"
-                    if clean_d and clean_d in listing["address"].lower():
-                        is_match = True
-                        break
-            else:
-                clean_district = district.lower().replace("район", "").replace("р-н", "").replace("ский", "").replace("ый", "").strip()
-                # Для "Центральный" ищем "центр", для "Ленинский" - "ленин"
-                if clean_district and clean_district in listing["address"].lower():
-                    is_match = True
-            
-            if not is_match:
-                distance += 10000000  # Огромный штраф, чтобы такие объявления были в конце
-
-        # Штраф за несовпадение этажа
-        if floor is not None:
-            try:
-                listing_floor = int(listing.get("floor", 0))
-                if listing_floor != floor:
-                    distance += 5000000  # Большой штраф
-            except (ValueError, TypeError):
-                pass
-
-        # Расстояние по площади
-        if min_area and listing["area"] < min_area:
-            # Если площадь меньше минимальной, штрафуем пропорционально разнице
-            distance += (min_area - listing["area"]) * 1000
-        elif max_area and listing["area"] > max_area:
-            # Если площадь больше максимальной, штрафуем пропорционально разнице
-            distance += (listing["area"] - max_area) * 1000
-        # Расстояние по бюджету
-        if min_price and listing["price"] < min_price:
-            distance += (min_price - listing["price"]) * 2
-        elif max_price and listing["price"] > max_price:
-            distance += (listing["price"] - max_price) * 2
-        elif max_price:
-            # Если цена в пределах бюджета, но далеко от него - небольшой штраф
-            # Предпочитаем объявления ближе к бюджету
-            distance += abs(listing["price"] - max_price) * 0.1
-        
-        return distance
-    
-    # Сначала ищем объявления, полностью соответствующие всем критериям
-    perfect_matches = [l for l in available_listings if matches_all_criteria(l)]
-    
-    return perfect_matches
-    
-    # Если идеальных совпадений нет - ищем максимально близкие по всем критериям
-    # Вычисляем расстояние для каждого объявления
-    # listings_with_distance = [(l, calculate_distance(l)) for l in available_listings]
-    
-    # Сортируем по расстоянию (от ближайших к дальним)
-    # closest_listings = sorted(listings_with_distance, key=lambda x: x[1])
-    
-    # Возвращаем ближайшие (до 15 самых близких)
-    # return [l[0] for l in closest_listings[:15]]
+    phones = repository.phones()
+    return [l.to_dict(phones) for l in dataset.records_at(indices)]
 
 
 def get_listing_by_id(listing_id: int, city: str = None, deal_type: str = None) -> Dict:
@@ -778,103 +582,30 @@ def get_listing_by_id(listing_id: int, city: str = None, deal_type: str = None)
     
     Args:
         listing_id: ID объявления
-        city: Город (для поиска в нужном CSV файле)
-        deal_type: Тип сделки ('rent' - аренда, 'sale' - продажа)
+        city: Город (не требуется: ID ищется по всем CSV, оставлен для совместимости)
+        deal_type: Тип сделки (не требуется, см. city)
     
     Returns:
-        Словарь с данными объявления или None если не найдено
+        Словарь с данными объявления (deal_type — из CSV, где оно найдено) или None если не найдено
     """
-    # Маппинг городов для поиска CSV файлов
-    city_mapping = {
-        "москва": "moscow",
-        "санкт-петербург": "spb",
-        "екатеринбург": "ekaterinburg",
-        "челябинск": "chelyabinsk"
-    }
-    
-    # Список путей к CSV файлам для проверки
-    csv_paths = []
-    
-    if city:
-        english_name = city_mapping.get(city.lower())
-        if english_name:
-            if deal_type:
-                deal_suffix = "_rent" if deal_type == "rent" else "_sale"
-                csv_paths.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), "parser", f"{english_name}_cian{deal_suffix}.csv"))
-            else:
-                # Проверяем оба типа
-                csv_paths.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), "parser", f"{english_name}_cian_rent.csv"))
-                csv_paths.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), "parser", f"{english_name}_cian_sale.csv"))
-    else:
-        # Проверяем все доступные CSV файлы
-        parser_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "parser")
-        if os.path.exists(parser_dir):
-            for filename in os.listdir(parser_dir):
-                if filename.endswith(".csv"):
-                    csv_paths.append(os.path.join(parser_dir, filename))
+    # Глобальный индекс id → объявление по всем CSV (listing_repository.py).
+    # ID уникален между файлами, поэтому city и deal_type для поиска не нужны:
+    # тип сделки берётся из файла, где объявление найдено (поле deal_type)
+    listing = repository.find(int(listing_id))
+    return listing.to_dict(repository.phones()) if listing else None
+
+
+def get_listings_by_ids(listing_ids: List[int]) -> List[Dict]:
+    """
+    Получает несколько объявлений по ID (для избранного и сравнения)
     
-    # Ищем объявление во всех CSV файлах
-    for csv_path in csv_paths:
-        if not os.path.exists(csv_path):
-            continue
-            
-        try:
-            with open(csv_path, 'r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    try:
-                        # Парсим данные аналогично parse_listings
-                        link = row.get("Ссылка", "")
-                        current_id = None
-                        
-                        # Пытаемся извлечь ID из ссылки CIAN
-                        if link and "cian.ru" in link:
-                            match = re.search(r'/(\d+)/', link)
-                            if match:
-                                current_id = int(match.group(1))
-                        
-                        # Если не удалось, используем хеш
-                        if not current_id:
-                            unique_str = link if link else f"{row.get('Адрес')}{row.get('Цена')}{row.get('Площадь')}"
-                            current_id = int(str(int(hashlib.md5(unique_str.encode('utf-8')).hexdigest(), 16))[:10])
-                        
-                        # Если нашли нужное объявление
-                        if current_id == listing_id:
-                            # Парсим цену
-                            price_str = row.get("Цена", "").replace(" ", "").replace("₽/мес.", "").replace("\xa0", "")
-                            price = int(price_str) if price_str.isdigit() else 0
-                            
-                            # Парсим площадь
-                            area_str = row.get("Площадь", "").replace(" м²", "").replace(",", ".").replace("\xa0", "")
-                            area = float(area_str) if area_str.replace(".", "").isdigit() else 0.0
-                            
-                            # Парсим этаж
-                            floor_str = row.get("Этаж", "1")
-                            try:
-                                floor_num = int(''.join(filter(str.isdigit, str(floor_str))) or "1")
-                            except (ValueError, TypeError):
-                                floor_num = 1
-                            
-                            # Определяем тип сделки из имени файла
-                            detected_deal_type = "rent" if "_rent" in csv_path else "sale" if "_sale" in csv_path else "rent"
-                            
-                            return {
-                                "id": current_id,
-                                "address": row.get("Адрес", ""),
-                                "area": area,
-                                "price": price,
-                                "floor": floor_num,
-                                "deal_type": detected_deal_type,
-                                "description": f"{row.get('Тип помещения', '')}. {row.get('Этажей в доме', '')} этажей.",
-                                "traffic": "неизвестно",
-                                "accessibility": "неизвестно",
-                                "link": row.get("Ссылка", ""),
-                                "phone": row.get("Телефон", "Не указан")
-                            }
-                    except Exception as e:
-                        continue
-        except Exception as e:
-            continue
+    Args:
+        listing_ids: Список ID объявлений
     
-    return None
-
+    Returns:
+        Список словарей объявлений в порядке listing_ids (ненайденные пропускаются)
+    """
+    ids = [int(listing_id) for listing_id in listing_ids]
+    found = repository.find_many(ids)
+    phones = repository.phones()
+    return [found[listing_id].to_dict(phones) for listing_id in ids if listing_id in found]